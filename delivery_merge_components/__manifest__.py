@@ -1,6 +1,6 @@
 {
     'name': 'Delivery Merge Components',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.1.0',
     'summary': '🔄 Merge duplicate components in delivery orders',
     'description': """
 Delivery Merge Components
@@ -14,6 +14,8 @@ Adds functionality to merge duplicate product components in delivery orders.
 • **Quantity Consolidation**: Automatically sums quantities of duplicate items
 • **Reservation Handling**: Properly manages stock reservations during merge
 • **Clean Interface**: Intuitive button placement in operations section
+• **Batch Merge**: Merge many selected deliveries at once from the Action menu
+• **Scheduled Merge**: Optional scheduled action merging new deliveries in chunks
 
 📋 **How it Works:**
 1. **Identify Duplicates**: Finds products with same product, location, UOM, and sale line
@@ -38,6 +40,7 @@ Adds functionality to merge duplicate product components in delivery orders.
     'category': 'Inventory/Inventory',
     'depends': ['stock'],
     'data': [
+        'data/ir_cron_data.xml',
         'views/stock_picking_views.xml',
     ],
     'installable': True,
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
 from . import stock_picking
+from . import stock_move
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super().create(vals_list)
+        moves._reset_duplicate_moves_checked()
+        return moves
+
+    def write(self, vals):
+        res = super().write(vals)
+        if vals.get('picking_id'):
+            self._reset_duplicate_moves_checked()
+        return res
+
+    def _reset_duplicate_moves_checked(self):
+        """A delivery receiving new moves may have duplicates again, so the
+        scheduled action has to check it once more"""
+        self.picking_id.filtered('duplicate_moves_checked').write({'duplicate_moves_checked': False})
@@ -3,62 +3,40 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 from collections import defaultdict
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
 
 
 class StockPicking(models.Model):
     _inherit = 'stock.picking'
 
+    duplicate_moves_checked = fields.Boolean(
+        string='Duplicate Moves Checked',
+        copy=False,
+        help='Duplicate moves of this delivery were already merged by the scheduled action'
+    )
+
     def action_merge_duplicate_moves(self):
         """
-        Merge duplicate stock moves in a delivery order.
-        Groups moves by product, location, UOM, and sale line, then consolidates quantities.
+        Merge duplicate stock moves in the selected delivery orders.
+        Groups moves by picking, product, location, UOM, and sale line, then consolidates quantities.
         """
         if not self.move_ids_without_package:
             raise UserError(_("No hay movimientos para fusionar."))
 
-        # Group moves by key (product, location_src, location_dest, product_uom, sale_line_id)
-        move_groups = defaultdict(list)
-        
-        for move in self.move_ids_without_package:
-            # Create grouping key
-            key = (
-                move.product_id.id,
-                move.location_id.id,
-                move.location_dest_id.id,
-                move.product_uom.id,
-                move.sale_line_id.id if move.sale_line_id else False
-            )
-            move_groups[key].append(move)
-        
-        merged_count = 0
+        merge_stats = self._merge_duplicate_moves()
         
-        # Process each group
-        for key, moves in move_groups.items():
-            if len(moves) > 1:  # Only process groups with duplicates
-                # Keep the first move as the main one
-                main_move = moves[0]
-                duplicate_moves = moves[1:]
-                
-                # Sum all quantities
-                total_quantity = sum(move.product_uom_qty for move in moves)
-                
-                # Update main move with total quantity
-                main_move.write({
-                    'product_uom_qty': total_quantity,
-                })
-                
-                # Delete duplicate moves
-                for dup_move in duplicate_moves:
-                    # Cancel the move first if it's not done
-                    if dup_move.state not in ('done', 'cancel'):
-                        dup_move._action_cancel()
-                    dup_move.unlink()
-                
-                merged_count += len(duplicate_moves)
-        
-        if merged_count > 0:
-            message = _("Se fusionaron %d movimientos duplicados.") % merged_count
-            self.message_post(body=message)
+        if merge_stats:
+            self._message_log_batch(bodies={
+                picking_id: self._get_merge_message(stats)
+                for picking_id, stats in merge_stats.items()
+            })
+            message = self._get_merge_message({
+                key: sum(stats[key] for stats in merge_stats.values())
+                for key in ('merged', 'kept', 'recomputed')
+            })
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -78,3 +56,159 @@ class StockPicking(models.Model):
                     'type': 'info',
                 }
             }
+
+    def _merge_duplicate_moves(self):
+        """
+        Merge the duplicate moves of all pickings in self at once.
+        The reservations (move lines) of the duplicates are handed over to
+        the surviving move, so reserved quants are not released and
+        reserved again; only the surviving moves that end up not fully
+        reserved go through _action_assign.
+        Returns a dict {picking_id: {'merged', 'kept', 'recomputed'}}
+        holding only the pickings where duplicates were found, with the
+        number of merged moves, of merged moves that kept their reservation
+        and of merged moves whose reservation was recomputed.
+        """
+        # Group open moves by key (picking, product, location_src, location_dest, product_uom, sale_line_id)
+        # in a single grouped read; done and cancelled moves are never merged
+        groups = self.env['stock.move']._read_group(
+            [
+                ('id', 'in', self.move_ids_without_package.ids),
+                ('state', 'not in', ('done', 'cancel')),
+            ],
+            ['picking_id', 'product_id', 'location_id', 'location_dest_id', 'product_uom', 'sale_line_id'],
+            ['id:array_agg', 'product_uom_qty:sum'],
+        )
+        
+        # Keep the oldest move of each group as the main one, and collect the
+        # main moves by their new quantity so they are updated in one write each
+        main_move_ids_by_qty = defaultdict(list)
+        main_move_id_by_duplicate = {}
+        merge_stats = defaultdict(lambda: {'merged': 0, 'kept': 0, 'recomputed': 0})
+        for picking, *key, move_ids, total_quantity in groups:
+            if len(move_ids) > 1:  # Only process groups with duplicates
+                move_ids = sorted(move_ids)
+                main_move_ids_by_qty[total_quantity].append(move_ids[0])
+                main_move_id_by_duplicate.update(dict.fromkeys(move_ids[1:], move_ids[0]))
+                merge_stats[picking.id]['merged'] += len(move_ids) - 1
+        
+        if not main_move_id_by_duplicate:
+            return {}
+        
+        Move = self.env['stock.move']
+        duplicate_moves = Move.browse(list(main_move_id_by_duplicate))
+        main_moves = Move.browse(list(set(main_move_id_by_duplicate.values())))
+        
+        # Main moves of the groups holding reservations before the merge
+        reserved_main_move_ids = {
+            main_move_id_by_duplicate.get(move.id, move.id)
+            for move in main_moves | duplicate_moves
+            if move.move_line_ids and move.state not in ('done', 'cancel')
+        }
+        
+        # Update main moves with total quantity
+        for total_quantity, move_ids in main_move_ids_by_qty.items():
+            Move.browse(move_ids).write({
+                'product_uom_qty': total_quantity,
+            })
+        
+        # Hand the reservations of the duplicates over to their main move
+        move_lines_by_main_move = defaultdict(lambda: self.env['stock.move.line'])
+        open_duplicates = duplicate_moves.filtered(lambda m: m.state not in ('done', 'cancel'))
+        for move_line in open_duplicates.move_line_ids:
+            move_lines_by_main_move[main_move_id_by_duplicate[move_line.move_id.id]] |= move_line
+        for main_move_id, move_lines in move_lines_by_main_move.items():
+            move_lines.write({'move_id': main_move_id})
+        
+        # Delete duplicate moves, cancelling those that are not done
+        open_duplicates._action_cancel()
+        duplicate_moves.unlink()
+        
+        # Reserve again only the main moves that are now short
+        main_moves._recompute_state()
+        moves_to_assign = Move.browse(list(reserved_main_move_ids)).filtered(
+            lambda m: m.state in ('confirmed', 'partially_available')
+        )
+        if moves_to_assign:
+            moves_to_assign._action_assign()
+        for move in Move.browse(list(reserved_main_move_ids)):
+            if move in moves_to_assign:
+                merge_stats[move.picking_id.id]['recomputed'] += 1
+            else:
+                merge_stats[move.picking_id.id]['kept'] += 1
+        
+        return dict(merge_stats)
+
+    @api.model
+    def _get_merge_message(self, stats):
+        """Return the message summing up the merge statistics of one or several deliveries"""
+        return _(
+            "Se fusionaron %(merged)d movimientos duplicados. "
+            "Reservas conservadas: %(kept)d, recalculadas: %(recomputed)d."
+        ) % stats
+
+    @api.model
+    def _cron_merge_duplicate_moves(self):
+        """
+        Merge the duplicate moves of confirmed outgoing deliveries that were
+        not checked yet, in chunks, until no delivery is left or the time
+        budget is spent. Each chunk is committed on its own.
+        A chunk that fails is merged again delivery by delivery, see
+        _merge_duplicate_moves_one_by_one, so a delivery that cannot be
+        merged does not block the next runs.
+        """
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        batch_size = int(get_param('delivery_merge_components.cron_batch_size', 50))
+        time_budget = int(get_param('delivery_merge_components.cron_time_budget', 60))
+        domain = [
+            ('picking_type_code', '=', 'outgoing'),
+            ('state', 'in', ('confirmed', 'waiting', 'assigned')),
+            ('duplicate_moves_checked', '=', False),
+        ]
+        
+        start = time.monotonic()
+        done = 0
+        while time.monotonic() - start < time_budget:
+            pickings = self.search(domain, limit=batch_size, order='id')
+            if not pickings:
+                break
+            try:
+                with self.env.cr.savepoint():
+                    merge_stats = pickings._merge_duplicate_moves()
+            except Exception as e:
+                self.env.invalidate_all()
+                _logger.warning(f"Merging duplicate moves of {len(pickings)} deliveries failed ({e}), merging them one by one")
+                merge_stats = pickings._merge_duplicate_moves_one_by_one()
+            if merge_stats:
+                pickings._message_log_batch(bodies={
+                    picking_id: self._get_merge_message(stats)
+                    for picking_id, stats in merge_stats.items()
+                })
+            pickings.write({'duplicate_moves_checked': True})
+            done += len(pickings)
+            _logger.info(f"Merged duplicate moves of {len(pickings)} deliveries ({sum(stats['merged'] for stats in merge_stats.values())} moves)")
+            self.env.cr.commit()
+        
+        self.env['ir.cron']._notify_progress(done=done, remaining=self.search_count(domain))
+
+    def _merge_duplicate_moves_one_by_one(self):
+        """
+        Merge the duplicate moves of each picking in its own savepoint.
+        The pickings that fail are left unmerged, with the error in their
+        chatter, and are flagged as checked by the caller like the others.
+        Returns the merge statistics of the pickings that succeeded, like
+        _merge_duplicate_moves.
+        """
+        merge_stats = {}
+        failures = {}
+        for picking in self:
+            try:
+                with self.env.cr.savepoint():
+                    merge_stats.update(picking._merge_duplicate_moves())
+            except Exception as e:
+                self.env.invalidate_all()
+                _logger.exception(f"Merging duplicate moves of {picking.name} failed")
+                failures[picking.id] = _("No se pudieron fusionar los movimientos duplicados: %s") % e
+        if failures:
+            self.browse(list(failures))._message_log_batch(bodies=failures)
+        return merge_stats
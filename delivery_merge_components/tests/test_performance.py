@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from odoo.tests import TransactionCase, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+# Benchmarks are not part of the standard test run:
+# odoo-bin -d <db> -i delivery_merge_components --test-tags delivery_merge_components_benchmark
+@tagged('post_install', '-at_install', '-standard', 'delivery_merge_components_benchmark')
+class TestMergeDuplicateMovesPerformance(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.products = cls.env['product.product'].create([{
+            'name': f'Component {i}',
+            'type': 'consu',
+        } for i in range(100)])
+        warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.env.company.id)], limit=1)
+        picking_type = warehouse.out_type_id
+        location = picking_type.default_location_src_id
+        location_dest = cls.env.ref('stock.stock_location_customers')
+        # 1,000 moves: 10 duplicates of each of the 100 products
+        cls.picking = cls.env['stock.picking'].create({
+            'picking_type_id': picking_type.id,
+            'location_id': location.id,
+            'location_dest_id': location_dest.id,
+            'move_ids': [(0, 0, {
+                'name': product.name,
+                'product_id': product.id,
+                'product_uom_qty': 1.0,
+                'product_uom': product.uom_id.id,
+                'location_id': location.id,
+                'location_dest_id': location_dest.id,
+            }) for i in range(10) for product in cls.products],
+        })
+        # Confirmed without action_confirm, which would merge the moves itself
+        cls.picking.move_ids.write({'state': 'confirmed'})
+
+    def test_merge_1000_moves(self):
+        """Wall time of the merge of a 1,000-move picking"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        start = time.perf_counter()
+        start_queries = self.env.cr.sql_log_count
+        merge_stats = self.picking._merge_duplicate_moves()
+        self.env.flush_all()
+        duration = time.perf_counter() - start
+        queries = self.env.cr.sql_log_count - start_queries
+        _logger.info(f"1,000-move picking merged in {duration:.3f}s ({queries} queries)")
+
+        self.assertEqual(merge_stats[self.picking.id]['merged'], 900)
+        moves = self.picking.move_ids
+        self.assertEqual(len(moves), 100)
+        self.assertEqual(moves.product_id, self.products)
+        self.assertTrue(all(qty == 10.0 for qty in moves.mapped('product_uom_qty')))
@@ -1,6 +1,6 @@
 {
     'name': 'Flexible BOM - Custom Manufacturing & Kits',
-    'version': '18.0.1.2.2',
+    'version': '18.0.1.3.0',
     'summary': '🔧 Create custom BOMs from sales orders | Manufacturing & Kit BOMs | Interactive wizard configuration',
     'description': """
 Flexible BOM - Custom Manufacturing & Kit Configuration
@@ -75,12 +75,15 @@ Transform your business today with Flexible BOM!
     'data': [
         'security/ir.model.access.csv',
         'data/cleanup_data.xml',
+        'data/ir_cron_data.xml',
         'views/product_views.xml',
         'views/sale_order_views.xml',
         'wizard/flexible_bom_wizard_views.xml',
+        'wizard/flexible_bom_order_wizard_views.xml',
         'wizard/base_bom_setup_wizard_views.xml',
         'views/mrp_bom_views.xml',
         'views/base_bom_actions.xml',
+        'views/flexible_bom_delivery_job_views.xml',
     ],
     'demo': [],
     'qweb': [],
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Deduplicate base BOMs before the partial unique indexes are created.
+
+    The oldest base BOM is kept for each template (template-level BOMs) and for
+    each variant (variant-level BOMs), like cleanup_duplicate_base_boms does.
+    """
+    if not version:
+        return
+
+    cr.execute("""
+        UPDATE mrp_bom bom
+        SET is_base_bom = false
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY product_tmpl_id ORDER BY create_date, id
+            ) AS position
+            FROM mrp_bom
+            WHERE is_base_bom AND product_id IS NULL
+        ) duplicate
+        WHERE bom.id = duplicate.id AND duplicate.position > 1
+    """)
+    _logger.info(f"Unmarked {cr.rowcount} duplicate template-level base BOMs")
+
+    cr.execute("""
+        UPDATE mrp_bom bom
+        SET is_base_bom = false
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY product_id ORDER BY create_date, id
+            ) AS position
+            FROM mrp_bom
+            WHERE is_base_bom AND product_id IS NOT NULL
+        ) duplicate
+        WHERE bom.id = duplicate.id AND duplicate.position > 1
+    """)
+    _logger.info(f"Unmarked {cr.rowcount} duplicate variant-level base BOMs")
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from . import product_template
+from . import product_category
 from . import sale_order
 from . import mrp_bom
+from . import flexible_bom_delivery_job
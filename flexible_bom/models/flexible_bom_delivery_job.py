@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class FlexibleBomDeliveryJob(models.Model):
+    _name = 'flexible.bom.delivery.job'
+    _description = 'Flexible BOM Delivery Update Job'
+    _order = 'id'
+
+    sale_order_line_id = fields.Many2one(
+        'sale.order.line',
+        string='Sales Order Line',
+        required=True,
+        ondelete='cascade'
+    )
+
+    order_id = fields.Many2one(
+        related='sale_order_line_id.order_id',
+        string='Sales Order',
+        store=True,
+        index=True
+    )
+
+    bom_id = fields.Many2one(
+        'mrp.bom',
+        string='Flexible BOM',
+        required=True,
+        ondelete='cascade'
+    )
+
+    previous_bom_id = fields.Many2one(
+        'mrp.bom',
+        string='Previous BOM',
+        ondelete='set null',
+        help='BOM the current deliveries were generated from'
+    )
+
+    cancel_existing_deliveries = fields.Boolean(
+        string='Cancel Existing Deliveries',
+        default=True
+    )
+
+    delivery_update_mode = fields.Selection([
+        ('incremental', 'Solo Cambios'),
+        ('rebuild', 'Recrear Todo')
+    ], string='Update Mode', default='incremental', required=True)
+
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], string='Status', default='pending', required=True, index=True)
+
+    result = fields.Text(
+        string='Result',
+        readonly=True
+    )
+
+    date_done = fields.Datetime(
+        string='Processed On',
+        readonly=True
+    )
+
+    @api.model
+    def _get_pending_job(self, sale_line):
+        """Return the pending job of the sale line, if any"""
+        return self.search([
+            ('sale_order_line_id', '=', sale_line.id),
+            ('state', '=', 'pending'),
+        ], limit=1)
+
+    @api.model
+    def _get_worker_crons(self):
+        """
+        Return the active scheduled actions processing the jobs.
+        Odoo never runs one scheduled action in two workers at once, so jobs
+        of different orders are processed in parallel by running several of
+        them; duplicates made by the administrator are included.
+        """
+        return self.env['ir.cron'].sudo().search([
+            ('model_id.model', '=', self._name),
+            ('code', 'ilike', '_cron_process_jobs'),
+        ])
+
+    @api.model
+    def _enqueue(self, sale_line, bom, previous_bom, cancel_existing_deliveries=True, delivery_update_mode='incremental'):
+        """
+        Queue the delivery update of a sale line to its new flexible BOM and
+        wake up the job processor.
+        A pending job of the same line is reused, so successive BOM changes
+        are applied once, from the BOM the deliveries were generated from.
+        """
+        job = self._get_pending_job(sale_line)
+        vals = {
+            'bom_id': bom.id,
+            'cancel_existing_deliveries': cancel_existing_deliveries,
+            'delivery_update_mode': delivery_update_mode,
+        }
+        if job:
+            job.write(vals)
+        else:
+            job = self.create(dict(vals,
+                sale_order_line_id=sale_line.id,
+                previous_bom_id=previous_bom.id,
+            ))
+        for cron in self._get_worker_crons():
+            cron._trigger()
+        return job
+
+    @api.model
+    def _cron_process_jobs(self, limit=100):
+        """
+        Process pending jobs, order by order.
+        The sale order row is locked while its jobs run, so the jobs of one
+        order are applied one after the other, in creation order, while
+        other workers (see _get_worker_crons) skip it and process other
+        orders. Each order is committed on its own.
+        """
+        cr = self.env.cr
+        jobs = self.search([('state', '=', 'pending')], limit=limit)
+        done = 0
+        for order in jobs.order_id:
+            cr.execute(
+                "SELECT id FROM sale_order WHERE id = %s FOR UPDATE SKIP LOCKED",
+                [order.id]
+            )
+            if not cr.fetchone():
+                _logger.info(f"Sale order {order.name} is locked by another worker, skipping its delivery jobs")
+                continue
+
+            # Read the jobs again now that the order is ours
+            order_jobs = self.search([
+                ('order_id', '=', order.id),
+                ('state', '=', 'pending'),
+            ])
+            for job in order_jobs:
+                job.with_user(job.create_uid).with_company(order.company_id)._run()
+            done += len(order_jobs)
+            cr.commit()
+
+        self.env['ir.cron']._notify_progress(
+            done=done,
+            remaining=self.search_count([('state', '=', 'pending')])
+        )
+
+    def _run(self):
+        """Update the deliveries of the job's sale line and post the outcome in the order chatter"""
+        self.ensure_one()
+        line = self.sale_order_line_id
+        order = line.order_id
+        _logger.info(f"=== PROCESSING DELIVERY JOB {self.id} for {order.name} ===")
+
+        try:
+            with self.env.cr.savepoint():
+                wizard = self.env['flexible.bom.wizard'].create({
+                    'sale_order_line_id': line.id,
+                    'base_bom_id': (self.bom_id.base_bom_id or self.previous_bom_id or self.bom_id).id,
+                    'product_id': line.product_id.id,
+                    'bom_type': self.bom_id.type,
+                    'order_confirmed': True,
+                    'cancel_existing_deliveries': self.cancel_existing_deliveries,
+                    'delivery_update_mode': self.delivery_update_mode,
+                })
+                result = wizard._update_deliveries(self.previous_bom_id or self.bom_id)
+        except Exception as e:
+            self.env.invalidate_all()
+            _logger.error(f"❌ Delivery job {self.id} failed: {str(e)}")
+            message = f"⚠️ No se pudieron actualizar las entregas de {line.name} con la BOM {self.bom_id.display_name}: {str(e)}"
+            self.write({
+                'state': 'failed',
+                'result': message,
+                'date_done': fields.Datetime.now(),
+            })
+        else:
+            if result.get('method') == 'incremental':
+                message = f"✅ Entregas de {line.name} actualizadas con la BOM {self.bom_id.display_name}: {result['summary']}"
+            else:
+                message = f"✅ Nueva entrega para {line.name} con la BOM {self.bom_id.display_name}: {result['picking_name']}"
+            self.write({
+                'state': 'done',
+                'result': message,
+                'date_done': fields.Datetime.now(),
+            })
+        order.message_post(body=message)
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Key of the per-transaction base BOM cache stored in ``cr.cache``
+BASE_BOM_CACHE_KEY = 'flexible_bom.base_bom_ids'
+
 
 class MrpBom(models.Model):
     _inherit = 'mrp.bom'
@@ -25,6 +28,7 @@ class MrpBom(models.Model):
     base_bom_id = fields.Many2one(
         'mrp.bom',
         string='Base BOM',
+        index='btree_not_null',
         help='Original BOM used as template for this flexible BOM'
     )
     
@@ -34,46 +38,27 @@ class MrpBom(models.Model):
         help='This BOM serves as a template for flexible BOM creation'
     )
 
-    # Note: SQL EXCLUDE constraint might not be supported in all PostgreSQL versions
-    # Using Python validation instead for better compatibility
+    # Uniqueness of base BOMs (one per template, one per variant) is enforced
+    # by the partial unique indexes created in init()
     _sql_constraints = [
         ('check_not_flexible_and_base', 
          'CHECK (NOT (is_flexible_bom = true AND is_base_bom = true))',
          'A BOM cannot be both flexible and base!'),
     ]
 
-    @api.constrains('is_base_bom', 'product_id', 'product_tmpl_id')
-    def _check_unique_base_bom(self):
-        """Ensure only one base BOM per product variant (or template if no specific variant)"""
-        for bom in self:
-            if bom.is_base_bom:
-                # If BOM is for a specific variant, check uniqueness by product_id
-                if bom.product_id:
-                    existing_base_boms = self.search([
-                        ('product_id', '=', bom.product_id.id),
-                        ('is_base_bom', '=', True),
-                        ('id', '!=', bom.id)
-                    ])
-                    if existing_base_boms:
-                        raise ValidationError(_(
-                            'There is already a base BOM for product variant "%s". '
-                            'Only one base BOM is allowed per product variant. '
-                            'Existing base BOM: %s'
-                        ) % (bom.product_id.display_name, existing_base_boms[0].display_name))
-                else:
-                    # If BOM is for template (all variants), check uniqueness by product_tmpl_id
-                    existing_base_boms = self.search([
-                        ('product_tmpl_id', '=', bom.product_tmpl_id.id),
-                        ('product_id', '=', False),  # Only template-level BOMs
-                        ('is_base_bom', '=', True),
-                        ('id', '!=', bom.id)
-                    ])
-                    if existing_base_boms:
-                        raise ValidationError(_(
-                            'There is already a base BOM for product template "%s" (template level). '
-                            'Only one base BOM is allowed per product template. '
-                            'Existing base BOM: %s'
-                        ) % (bom.product_tmpl_id.name, existing_base_boms[0].display_name))
+    def init(self):
+        super().init()
+        cr = self.env.cr
+        cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS mrp_bom_base_bom_template_uniq
+            ON mrp_bom (product_tmpl_id)
+            WHERE is_base_bom AND product_id IS NULL
+        """)
+        cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS mrp_bom_base_bom_variant_uniq
+            ON mrp_bom (product_id)
+            WHERE is_base_bom AND product_id IS NOT NULL
+        """)
 
     @api.constrains('is_flexible_bom', 'is_base_bom')
     def _check_flexible_not_base(self):
@@ -85,139 +70,178 @@ class MrpBom(models.Model):
                     'Flexible BOMs are derived from base BOMs.'
                 ))
 
+    flexible_bom_ids = fields.One2many(
+        'mrp.bom',
+        'base_bom_id',
+        string='Flexible BOMs',
+        help='Flexible BOMs created from this base BOM'
+    )
+
     flexible_bom_count = fields.Integer(
         string='Flexible BOMs Created',
         compute='_compute_flexible_bom_count',
+        store=True,
         help='Number of flexible BOMs created from this base BOM'
     )
 
-    @api.depends('is_base_bom')
+    @api.depends('is_base_bom', 'flexible_bom_ids', 'flexible_bom_ids.active')
     def _compute_flexible_bom_count(self):
+        base_boms = self.filtered(lambda bom: bom.is_base_bom and bom.id)
+        counts = dict(self._read_group(
+            [('base_bom_id', 'in', base_boms.ids)],
+            ['base_bom_id'],
+            ['__count'],
+        )) if base_boms else {}
         for bom in self:
-            if bom.is_base_bom:
-                bom.flexible_bom_count = self.search_count([('base_bom_id', '=', bom.id)])
-            else:
-                bom.flexible_bom_count = 0
+            bom.flexible_bom_count = counts.get(bom, 0)
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Override create to handle base BOM logic"""
+        """Override create to handle base BOM logic
+
+        Base BOMs are resolved for the whole ``vals_list`` at once, so creating
+        many BOMs costs a constant number of queries.
+        """
         boms = super().create(vals_list)
-        
-        for bom in boms:
-            # If this is a flexible BOM and we have a base BOM set, mark it as base
-            if bom.is_flexible_bom and bom.base_bom_id:
-                bom.base_bom_id.is_base_bom = True
-            elif bom.is_flexible_bom and not bom.base_bom_id:
-                # If this is a flexible BOM and we don't have a base BOM set,
-                # try to find and mark the appropriate base BOM
-                base_bom = self._find_base_bom_for_product(bom.product_tmpl_id)
+        flexible_boms = boms.filtered('is_flexible_bom')
+        
+        # Flexible BOMs without base BOM get the appropriate base BOM of their product
+        boms_without_base = flexible_boms.filtered(lambda bom: not bom.base_bom_id)
+        if boms_without_base:
+            base_boms = self._find_base_boms_for_templates(boms_without_base.product_tmpl_id)
+            for bom in boms_without_base:
+                base_bom = base_boms.get(bom.product_tmpl_id.id)
                 if base_bom:
                     bom.base_bom_id = base_bom.id
-                    base_bom.is_base_bom = True
         
+        # The BOMs flexible BOMs are derived from are base BOMs
+        flexible_boms.base_bom_id.filtered(lambda bom: not bom.is_base_bom).write({'is_base_bom': True})
+        
+        # For new non-flexible BOMs, mark the first one of each product as base
+        # when no base BOM exists for this product yet
+        standard_boms = (boms - flexible_boms).filtered(lambda bom: not bom.is_base_bom)
+        if standard_boms:
+            templates_with_base = set(self.search([
+                ('product_tmpl_id', 'in', standard_boms.product_tmpl_id.ids),
+                ('is_base_bom', '=', True)
+            ]).product_tmpl_id.ids)
+            new_base_boms = self.browse()
+            for bom in standard_boms:
+                if bom.product_tmpl_id.id not in templates_with_base:
+                    templates_with_base.add(bom.product_tmpl_id.id)
+                    new_base_boms |= bom
+            new_base_boms.write({'is_base_bom': True})
+        
+        self._invalidate_base_bom_cache()
         return boms
 
-    def write(self, vals):
-        """Override write to handle base BOM validation"""
-        # If trying to mark as base BOM, validate uniqueness
-        if vals.get('is_base_bom'):
-            for bom in self:
-                if bom.is_flexible_bom:
-                    raise ValidationError(_("Flexible BOMs cannot be marked as base BOMs."))
-                
-                existing_base_bom = self.search([
-                    ('product_tmpl_id', '=', bom.product_tmpl_id.id),
-                    ('is_base_bom', '=', True),
-                    ('id', '!=', bom.id)
-                ], limit=1)
-                
-                if existing_base_bom:
-                    raise ValidationError(_(
-                        'There is already a base BOM for product "%s" (BOM: %s). '
-                        'Only one base BOM is allowed per product template. '
-                        'Use "Replace Base BOM" action if you want to replace it.'
-                    ) % (bom.product_tmpl_id.name, existing_base_bom.display_name))
-        
-        return super().write(vals)
+    def _find_base_boms_for_templates(self, product_tmpls):
+        """Find the most appropriate base BOM of several products at once.
 
-    def _find_base_bom_for_product(self, product_tmpl):
-        """Find the most appropriate base BOM for a product"""
-        # Look for existing base BOM
-        base_bom = self.search([
-            ('product_tmpl_id', '=', product_tmpl.id),
+        Returns a dict ``{product_tmpl_id: bom}``. Templates without base BOM
+        get their oldest non-flexible BOM promoted to base.
+        """
+        base_boms = {}
+        # Look for existing base BOMs
+        for bom in self.search([
+            ('product_tmpl_id', 'in', product_tmpls.ids),
             ('is_base_bom', '=', True),
             ('is_flexible_bom', '=', False)
-        ], limit=1)
-        
-        if base_bom:
-            return base_bom
+        ]):
+            base_boms.setdefault(bom.product_tmpl_id.id, bom)
         
         # If no base BOM exists, find the oldest non-flexible BOM
-        oldest_bom = self.search([
-            ('product_tmpl_id', '=', product_tmpl.id),
-            ('is_flexible_bom', '=', False),
-            ('company_id', 'in', [self.env.company.id, False])
-        ], order='create_date asc', limit=1)
-        
-        if oldest_bom:
-            oldest_bom.is_base_bom = True
-            return oldest_bom
-        
-        return False
-
-    @api.model_create_multi
-    def create(self, vals_list):
-        """Override create to handle base BOM logic"""
-        boms = super().create(vals_list)
-        
-        for bom in boms:
-            # If this is a flexible BOM and we have a base BOM set, mark it as base
-            if bom.is_flexible_bom and bom.base_bom_id:
-                bom.base_bom_id.is_base_bom = True
-            elif bom.is_flexible_bom and not bom.base_bom_id:
-                # If this is a flexible BOM and we don't have a base BOM set,
-                # try to find and mark the appropriate base BOM
-                base_bom = self._find_base_bom_for_product(bom.product_tmpl_id)
-                if base_bom:
-                    bom.base_bom_id = base_bom.id
-                    base_bom.is_base_bom = True
-            elif not bom.is_flexible_bom and not bom.is_base_bom:
-                # For new non-flexible BOMs, check if we should mark as base
-                existing_base = self.search([
-                    ('product_tmpl_id', '=', bom.product_tmpl_id.id),
-                    ('is_base_bom', '=', True)
-                ], limit=1)
-                if not existing_base:
-                    # No base BOM exists for this product, mark this as base
-                    bom.is_base_bom = True
-        
-        return boms
+        missing_tmpl_ids = [tmpl_id for tmpl_id in product_tmpls.ids if tmpl_id not in base_boms]
+        if missing_tmpl_ids:
+            boms_to_promote = self.browse()
+            for bom in self.search([
+                ('product_tmpl_id', 'in', missing_tmpl_ids),
+                ('is_flexible_bom', '=', False),
+                ('company_id', 'in', [self.env.company.id, False])
+            ], order='create_date asc'):
+                if bom.product_tmpl_id.id not in base_boms:
+                    base_boms[bom.product_tmpl_id.id] = bom
+                    boms_to_promote |= bom
+            boms_to_promote.write({'is_base_bom': True})
+        
+        return base_boms
 
     def _find_base_bom_for_product(self, product_tmpl):
         """Find the most appropriate base BOM for a product"""
-        # Look for existing base BOM
-        base_bom = self.search([
-            ('product_tmpl_id', '=', product_tmpl.id),
-            ('is_base_bom', '=', True),
-            ('is_flexible_bom', '=', False)
-        ], limit=1)
-        
-        if base_bom:
-            return base_bom
-        
-        # If no base BOM exists, find the oldest non-flexible BOM
-        oldest_bom = self.search([
-            ('product_tmpl_id', '=', product_tmpl.id),
-            ('is_flexible_bom', '=', False),
-            ('company_id', 'in', [self.env.company.id, False])
-        ], order='create_date asc', limit=1)
-        
-        if oldest_bom:
-            oldest_bom.is_base_bom = True
-            return oldest_bom
+        return self._find_base_boms_for_templates(product_tmpl).get(product_tmpl.id, False)
+
+    def write(self, vals):
+        """Override write to handle base BOM validation"""
+        if vals.get('is_base_bom') and any(self.mapped('is_flexible_bom')):
+            raise ValidationError(_("Flexible BOMs cannot be marked as base BOMs."))
         
-        return False
+        res = super().write(vals)
+        self._invalidate_base_bom_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._invalidate_base_bom_cache()
+        return res
+
+    @api.model
+    def _get_base_bom_cache(self):
+        """Per-transaction cache of resolved base BOMs.
+
+        Maps ``(product_tmpl_id, product_id, company_id, bom_type)`` to the base
+        BOM id (or ``False``). It is dropped at the end of the transaction and
+        whenever a BOM is created, written or unlinked.
+        """
+        cr = self.env.cr
+        cache = cr.cache.get(BASE_BOM_CACHE_KEY)
+        if cache is None:
+            cache = cr.cache[BASE_BOM_CACHE_KEY] = {}
+            cr.postcommit.add(self._invalidate_base_bom_cache)
+            cr.postrollback.add(self._invalidate_base_bom_cache)
+        return cache
+
+    @api.model
+    def _invalidate_base_bom_cache(self):
+        self.env.cr.cache.pop(BASE_BOM_CACHE_KEY, None)
+
+    def _get_base_boms_by_product(self, products, company_id=False, bom_type='normal'):
+        """Resolve the base BOM of every product in ``products`` without writing.
+
+        A base BOM defined for the specific variant wins over the template-level one.
+        Results are memoised in the per-transaction base BOM cache, and all cache
+        misses are fetched with a single query.
+        Returns a dict ``{product: bom}``; products without base BOM map to an
+        empty recordset.
+        """
+        company_id = company_id or self.env.company.id
+        cache = self._get_base_bom_cache()
+
+        def cache_key(product):
+            return (product.product_tmpl_id.id, product.id, company_id, bom_type)
+
+        missing_products = products.filtered(lambda p: cache_key(p) not in cache)
+        if missing_products:
+            base_boms = self.search([
+                ('product_tmpl_id', 'in', missing_products.product_tmpl_id.ids),
+                ('is_base_bom', '=', True),
+                ('company_id', 'in', [company_id, False]),
+                ('type', '=', bom_type)
+            ])
+
+            variant_boms = {}
+            template_boms = {}
+            for bom in base_boms:
+                if bom.product_id:
+                    variant_boms.setdefault(bom.product_id.id, bom.id)
+                else:
+                    template_boms.setdefault(bom.product_tmpl_id.id, bom.id)
+
+            for product in missing_products:
+                cache[cache_key(product)] = (
+                    variant_boms.get(product.id) or template_boms.get(product.product_tmpl_id.id) or False
+                )
+
+        return {product: self.browse(cache[cache_key(product)]) for product in products}
 
     @api.model
     def _bom_find(self, products, **kwargs):
@@ -252,103 +276,230 @@ class MrpBom(models.Model):
         if not hasattr(products, 'ids'):
             products = self.env['product.product'].browse(products.id if hasattr(products, 'id') else products)
         
+        # Resolve the base BOMs of all products at once
+        base_boms = self._get_base_boms_by_product(products, company_id=company_id, bom_type=bom_type)
+        
         # Handle dictionary result (multiple products)
+        # This is a read-only path: BOMs without base BOM are promoted by
+        # _promote_default_base_boms, never while procurement is reading them.
         if isinstance(result, dict):
             enhanced_result = {}
             
+            # Flexible BOMs of the order being procured, resolved by sale_order_approval
+            flexible_bom_map = self.env.context.get('flexible_bom_by_product') or {}
+            
             # Ensure all products are in the result, even if no BOM was found
             for product in products:
                 original_bom = result.get(product, False)
                 
-                # Try to find base BOM for this product
-                base_bom = self.search([
-                    ('product_tmpl_id', '=', product.product_tmpl_id.id),
-                    ('is_base_bom', '=', True),
-                    ('company_id', 'in', [company_id or self.env.company.id, False]),
-                    ('type', '=', bom_type)
-                ], limit=1)
-                
-                # Ensure singleton result
-                if base_bom:
-                    base_bom.ensure_one()  # Validate it's a singleton
-                    enhanced_result[product] = base_bom
-                elif original_bom and hasattr(original_bom, 'is_flexible_bom') and not original_bom.is_flexible_bom:
-                    # Ensure original_bom is also singleton before marking
-                    if hasattr(original_bom, 'ensure_one'):
-                        original_bom.ensure_one()
-                    # Mark existing BOM as base
-                    original_bom.is_base_bom = True
+                if original_bom and flexible_bom_map.get(product.id) == original_bom.id:
                     enhanced_result[product] = original_bom
+                elif base_boms[product]:
+                    enhanced_result[product] = base_boms[product]
                 else:
                     # Use empty recordset instead of False to prevent AttributeError
                     enhanced_result[product] = original_bom if original_bom else self.env['mrp.bom']
             
-            # Final validation: ensure all values are singleton or empty
-            for product, bom in enhanced_result.items():
-                if bom and hasattr(bom, 'ids') and len(bom.ids) > 1:
-                    _logger.error(f"Final validation failed: multiple BOMs for product {product.id}: {bom.ids}. Forcing singleton.")
-                    enhanced_result[product] = bom[0]
-                    enhanced_result[product].ensure_one()
-            
             return enhanced_result
         
         # Handle single product/BOM result
         else:
             if len(products) == 1:
                 product = products[0]
-                
-                # Try to find base BOM for this product
-                base_bom = self.search([
-                    ('product_tmpl_id', '=', product.product_tmpl_id.id),
-                    ('is_base_bom', '=', True),
-                    ('company_id', 'in', [company_id or self.env.company.id, False]),
-                    ('type', '=', bom_type)
-                ], limit=1)
-                
-                if base_bom:
-                    base_bom.ensure_one()  # Validate it's a singleton
-                    return base_bom
-                elif result and hasattr(result, 'is_flexible_bom') and not result.is_flexible_bom:
-                    # Ensure result is singleton before marking
-                    if hasattr(result, 'ensure_one'):
-                        result.ensure_one()
-                    # Mark existing BOM as base
-                    result.is_base_bom = True
-                
-                # Final validation for single product result
-                if result and hasattr(result, 'ids') and len(result.ids) > 1:
-                    _logger.error(f"Final validation failed for single product {product.id}: multiple BOMs {result.ids}. Forcing singleton.")
-                    result = result[0]
-                    result.ensure_one()
-                
-                return result
+                return base_boms[product] or result
             else:
                 # Multiple products but got single result - shouldn't happen, return as-is
                 return result
 
+    @api.model
+    @tools.ormcache('bom_id', 'company_id', 'version')
+    def _get_cached_unit_cost(self, bom_id, company_id, version):
+        """Cost of one unit of a BOM, shared across requests.
+
+        The cache is keyed by the version of the BOM tree built by
+        ``_get_unit_costs``, so a change anywhere in the tree gives a new key
+        and the outdated entries are never read again.
+        """
+        return self._compute_unit_cost(bom_id, company_id, version)
+
+    @api.model
+    def _compute_unit_cost(self, bom_id, company_id, version, costs=None):
+        """Roll up the cost of one unit of a BOM, in the BOM UoM.
+
+        ``version`` gives the sub-BOM of each line, whose cost is taken from
+        ``costs`` when it was computed by the caller, or else from the cache.
+        """
+        bom = self.browse(bom_id)
+        company = self.env['res.company'].browse(company_id)
+        costs = costs or {}
+        sub_boms = {line_id: sub_bom for line_id, _date, _product_id, _product_date, sub_bom in version[1]}
+        total = 0.0
+        for line in bom.bom_line_ids:
+            product = line.product_id.with_company(company)
+            sub_bom = sub_boms.get(line.id)
+            if sub_bom:
+                sub_bom_id, sub_version = sub_bom
+                if sub_bom_id in costs:
+                    cost = costs[sub_bom_id]
+                else:
+                    cost = self._get_cached_unit_cost(sub_bom_id, company_id, sub_version)
+                price = self.browse(sub_bom_id).product_uom_id._compute_price(cost, product.uom_id)
+            else:
+                price = product.standard_price
+            total += line.product_uom_id._compute_quantity(line.product_qty, product.uom_id) * price
+        return total / (bom.product_qty or 1.0)
+
+    def _get_unit_costs(self, company=None):
+        """Cost of one unit of the product of each BOM, in the BOM UoM.
+
+        Component costs are rolled up bottom-up through their own BOMs; the
+        other components are costed at their standard price, and quantities
+        are converted to the component UoM. Sub-BOMs are resolved level by
+        level with one ``_bom_find`` call per level.
+
+        Costs are cached across requests by version: the write dates of the
+        BOM, its lines, their products and, recursively, their sub-BOMs. A
+        new standard price or any edit of the tree changes the version, so
+        only unchanged configurations are served from the cache. Trees
+        modified in the current transaction are costed without it, as their
+        write dates do not change again before the commit.
+        Returns a dict ``{bom_id: cost}``.
+        """
+        company = company or self.env.company
+        Bom = self.env['mrp.bom'].with_context(flexible_bom_id=False, flexible_bom_by_product=False)
+
+        # Resolve the sub-BOMs of the whole trees
+        sub_boms = {}
+        level = self
+        seen = self.browse()
+        while level:
+            seen |= level
+            products = level.bom_line_ids.product_id.filtered(lambda p: p not in sub_boms)
+            if products:
+                found = Bom._bom_find(products, company_id=company.id)
+                for product in products:
+                    sub_boms[product] = found.get(product) or self.browse()
+            level = self.browse().union(*(
+                sub_boms[line.product_id] for line in level.bom_line_ids
+            )) - seen
+
+        # Read the write dates and standard prices of all components at once
+        components = seen.bom_line_ids.product_id.with_company(company)
+        components.fetch(['standard_price', 'uom_id', 'write_date'])
+
+        now = self.env.cr.now()
+        versions = {}
+        # Costs of the trees modified in this transaction
+        costs = {}
+
+        def version(bom, path):
+            if bom.id in versions:
+                return versions[bom.id]
+            if bom.id in path:
+                raise UserError(_("The BOM %s contains itself in its sub-BOMs.", bom.display_name))
+            path.add(bom.id)
+            modified = bom.write_date == now
+            lines = []
+            for line in bom.bom_line_ids:
+                product = line.product_id
+                sub_bom = sub_boms.get(product)
+                sub_version = sub_bom and (sub_bom.id, version(sub_bom, path))
+                modified = (
+                    modified or now in (line.write_date, product.write_date)
+                    or bool(sub_bom and sub_bom.id in costs)
+                )
+                lines.append((line.id, line.write_date, product.id, product.write_date, sub_version or None))
+            path.discard(bom.id)
+            versions[bom.id] = (bom.write_date, tuple(lines))
+            if modified:
+                costs[bom.id] = self._compute_unit_cost(bom.id, company.id, versions[bom.id], costs)
+            return versions[bom.id]
+
+        for bom in self:
+            version(bom, set())
+        return {
+            bom.id: costs[bom.id] if bom.id in costs
+            else self._get_cached_unit_cost(bom.id, company.id, versions[bom.id])
+            for bom in self
+        }
+
+    @api.model
+    def _get_product_unit_costs(self, products, company=None):
+        """Cost of one unit of each product, in the product UoM.
+
+        Products that have a BOM are costed through ``_get_unit_costs``, the
+        others at their standard price, read for all of them at once.
+        Returns a dict ``{product: cost}``.
+        """
+        company = company or self.env.company
+        if not products:
+            return {}
+        boms = self.with_context(flexible_bom_id=False, flexible_bom_by_product=False)._bom_find(
+            products, company_id=company.id
+        )
+        boms = {product: bom for product, bom in boms.items() if bom}
+        bom_costs = self.browse().union(*boms.values())._get_unit_costs(company)
+        products = products.with_company(company)
+        products.fetch(['standard_price', 'uom_id'])
+
+        costs = {}
+        for product in products:
+            bom = boms.get(product)
+            if bom:
+                costs[product] = bom.product_uom_id._compute_price(bom_costs[bom.id], product.uom_id)
+            else:
+                costs[product] = product.standard_price
+        return costs
+
+    def _get_conflicting_base_boms(self):
+        """Return ``{bom: conflicting BOM}`` for the BOMs of ``self`` that would
+        violate the base BOM unique indexes if marked as base, using one query.
+
+        A BOM conflicts with an existing base BOM of the same template and
+        variant, or with another BOM of ``self`` for the same template and
+        variant.
+        """
+        existing_base_boms = self.search([
+            ('product_tmpl_id', 'in', self.product_tmpl_id.ids),
+            ('is_base_bom', '=', True),
+            ('id', 'not in', self.ids)
+        ])
+        base_bom_by_key = {}
+        for existing in existing_base_boms:
+            base_bom_by_key.setdefault((existing.product_tmpl_id.id, existing.product_id.id), existing)
+        conflicts = {}
+        for bom in self:
+            key = (bom.product_tmpl_id.id, bom.product_id.id)
+            if key in base_bom_by_key:
+                conflicts[bom] = base_bom_by_key[key]
+            else:
+                # The next BOM of self for the same product conflicts with this one
+                base_bom_by_key[key] = bom
+        return conflicts
+
     def mark_as_base_bom(self):
         """Action to manually mark a BOM as base BOM"""
-        for bom in self:
-            if bom.is_flexible_bom:
-                raise UserError(_("Flexible BOMs cannot be marked as base BOMs."))
-            
-            # Check if there's already a base BOM for this product
-            existing_base_bom = self.search([
-                ('product_tmpl_id', '=', bom.product_tmpl_id.id),
-                ('is_base_bom', '=', True),
-                ('id', '!=', bom.id)
-            ], limit=1)
-            
-            if existing_base_bom:
-                # Ask user what to do with existing base BOM
+        if any(self.mapped('is_flexible_bom')):
+            raise UserError(_("Flexible BOMs cannot be marked as base BOMs."))
+        
+        # Check if there's already a base BOM for these products
+        conflicts = self._get_conflicting_base_boms()
+        if conflicts:
+            bom, existing_base_bom = next(iter(conflicts.items()))
+            if existing_base_bom in self:
                 raise UserError(_(
-                    'There is already a base BOM for product "%s" (BOM: %s). '
-                    'Only one base BOM is allowed per product. '
-                    'Please first unmark the existing base BOM or use the replacement function.'
-                ) % (bom.product_tmpl_id.name, existing_base_bom.display_name))
-            
-            # Mark this as base BOM
-            bom.is_base_bom = True
+                    'BOMs %s and %s are for the same product "%s". '
+                    'Only one base BOM is allowed per product, please select only one of them.'
+                ) % (existing_base_bom.display_name, bom.display_name, bom.product_tmpl_id.name))
+            # Ask user what to do with existing base BOM
+            raise UserError(_(
+                'There is already a base BOM for product "%s" (BOM: %s). '
+                'Only one base BOM is allowed per product. '
+                'Please first unmark the existing base BOM or use the replacement function.'
+            ) % (bom.product_tmpl_id.name, existing_base_bom.display_name))
+        
+        # Mark these as base BOMs
+        self.write({'is_base_bom': True})
 
     def replace_as_base_bom(self):
         """Replace existing base BOM with this one"""
@@ -356,15 +507,20 @@ class MrpBom(models.Model):
             if bom.is_flexible_bom:
                 raise UserError(_("Flexible BOMs cannot be marked as base BOMs."))
             
-            # Unmark any existing base BOM for this product
+            # Unmark the existing base BOM at the same level: the
+            # template-level one, or the one of the same variant
             existing_base_boms = self.search([
                 ('product_tmpl_id', '=', bom.product_tmpl_id.id),
+                ('product_id', '=', bom.product_id.id),
                 ('is_base_bom', '=', True),
                 ('id', '!=', bom.id)
             ])
             
             if existing_base_boms:
                 existing_base_boms.write({'is_base_bom': False})
+                # Flush before marking the new base BOM, the unique indexes are
+                # checked row by row
+                existing_base_boms.flush_recordset(['is_base_bom'])
                 
             # Mark this as base BOM
             bom.is_base_bom = True
@@ -456,6 +612,33 @@ class MrpBom(models.Model):
         _logger.info("Cleanup of duplicate base BOMs completed.")
         return True
 
+    @api.model
+    def _promote_default_base_boms(self):
+        """Mark a base BOM for every product template that has BOMs but no base BOM.
+
+        The oldest active non-flexible BOM of the template is promoted, preferring
+        template-level BOMs over variant-specific ones. All templates are handled
+        with one query and one write.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (bom.product_tmpl_id) bom.id
+            FROM mrp_bom bom
+            WHERE bom.active
+              AND bom.is_flexible_bom IS NOT TRUE
+              AND NOT EXISTS (
+                  SELECT 1 FROM mrp_bom base
+                  WHERE base.product_tmpl_id = bom.product_tmpl_id
+                    AND base.is_base_bom
+              )
+            ORDER BY bom.product_tmpl_id, bom.product_id NULLS FIRST, bom.create_date, bom.id
+        """)
+        bom_ids = [row[0] for row in self.env.cr.fetchall()]
+        if bom_ids:
+            _logger.info(f"Promoting {len(bom_ids)} BOMs to base BOM")
+            self.browse(bom_ids).write({'is_base_bom': True})
+        return len(bom_ids)
+
     @api.model
     def _run_integrity_check_and_cleanup(self):
         """Run integrity check and cleanup. Can be called manually or automatically."""
@@ -464,6 +647,9 @@ class MrpBom(models.Model):
         # First, cleanup duplicates
         self.cleanup_duplicate_base_boms()
         
+        # Then make sure every product with BOMs has a base BOM
+        self._promote_default_base_boms()
+        
         # Then validate integrity
         issues = self.validate_base_bom_integrity()
         if issues:
@@ -478,19 +664,25 @@ class MrpBom(models.Model):
         """Validate that base BOM rules are followed throughout the system"""
         issues = []
         
-        # Check for multiple base BOMs per product
+        # Check for multiple base BOMs per template (template-level BOMs) or
+        # per variant (variant-level BOMs), like the unique indexes; a
+        # template-level base BOM may coexist with variant-level ones
         self.env.cr.execute("""
-            SELECT product_tmpl_id, COUNT(*) as count
+            SELECT product_tmpl_id, product_id, COUNT(*) as count
             FROM mrp_bom 
             WHERE is_base_bom = true 
-            GROUP BY product_tmpl_id 
+            GROUP BY product_tmpl_id, product_id 
             HAVING COUNT(*) > 1
         """)
         
         duplicate_products = self.env.cr.fetchall()
-        for product_tmpl_id, count in duplicate_products:
-            product_tmpl = self.env['product.template'].browse(product_tmpl_id)
-            issues.append(f"Product '{product_tmpl.name}' has {count} base BOMs (should be 1)")
+        for product_tmpl_id, product_id, count in duplicate_products:
+            if product_id:
+                product = self.env['product.product'].browse(product_id)
+                issues.append(f"Variant '{product.display_name}' has {count} base BOMs (should be 1)")
+            else:
+                product_tmpl = self.env['product.template'].browse(product_tmpl_id)
+                issues.append(f"Product '{product_tmpl.name}' has {count} template-level base BOMs (should be 1)")
         
         # Check for flexible BOMs marked as base
         flexible_base_boms = self.search([
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class ProductCategory(models.Model):
+    _inherit = 'product.category'
+
+    flexible_bom_margin = fields.Float(
+        string='Flexible BOM Margin (%)',
+        default=20.0,
+        help='Margin added to the component cost of a flexible BOM to compute the sale price of its product'
+    )
@@ -7,6 +7,25 @@ from odoo.exceptions import UserError
 class SaleOrder(models.Model):
     _inherit = 'sale.order'
 
+    def action_configure_flexible_boms(self):
+        """Open wizard to configure the flexible BOMs of all lines of the order at once"""
+        self.ensure_one()
+        
+        if self.state != 'bom_customization':
+            raise UserError("Flexible BOMs of the whole order can only be configured in the BOM customization phase")
+        
+        if not self.order_line.filtered(lambda line: line.product_id.is_flexible_bom):
+            raise UserError("This order has no product configured for Flexible BOM")
+        
+        return {
+            'name': 'Configure Flexible BOMs',
+            'type': 'ir.actions.act_window',
+            'res_model': 'flexible.bom.order.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_order_id': self.id},
+        }
+
 
 class SaleOrderLine(models.Model):
     _inherit = 'sale.order.line'
@@ -32,38 +51,9 @@ class SaleOrderLine(models.Model):
                              "Please coordinate with the production team.")
         
         # Get base BOM for the product with variant-specific priority
-        # First, try to find a base BOM specific to this product variant
-        base_bom = self.env['mrp.bom'].search([
-            ('product_id', '=', self.product_id.id),  # Specific variant
-            ('is_base_bom', '=', True),
-            ('company_id', 'in', [self.company_id.id, False]),
-            ('type', 'in', ['normal', 'phantom'])  # Support both Manufacturing and Kit BOMs
-        ], limit=1)
-        
-        # If no variant-specific base BOM found, fallback to template-level base BOM
-        if not base_bom:
-            base_bom = self.env['mrp.bom'].search([
-                ('product_tmpl_id', '=', self.product_id.product_tmpl_id.id),
-                ('product_id', '=', False),  # Template level (no specific variant)
-                ('is_base_bom', '=', True),
-                ('company_id', 'in', [self.company_id.id, False]),
-                ('type', 'in', ['normal', 'phantom'])  # Support both Manufacturing and Kit BOMs
-            ], limit=1)
-        
+        base_bom = self._get_flexible_base_boms()[self]
         if not base_bom:
-            # Provide helpful error message
-            if self.product_id.product_tmpl_id.product_variant_count > 1:
-                raise UserError(
-                    "No base BOM found for product variant '%s'. "
-                    "Please create a base BOM either for this specific variant "
-                    "or for the product template '%s'." % 
-                    (self.product_id.display_name, self.product_id.product_tmpl_id.name)
-                )
-            else:
-                raise UserError(
-                    "No base BOM found for product '%s'. Please create a base BOM first." % 
-                    self.product_id.name
-                )
+            self._raise_missing_base_bom()
         
         # Determine wizard title based on order state
         wizard_title = 'Configure Flexible BOM'
@@ -88,6 +78,53 @@ class SaleOrderLine(models.Model):
             'context': context
         }
 
+    def _get_flexible_base_boms(self):
+        """Return ``{line: base BOM}`` for all lines, fetched with a single query.
+
+        A base BOM specific to the product variant wins over the template-level
+        one. Lines without base BOM map to an empty recordset.
+        """
+        base_boms = self.env['mrp.bom'].search([
+            ('product_tmpl_id', 'in', self.product_id.product_tmpl_id.ids),
+            ('is_base_bom', '=', True),
+            ('company_id', 'in', self.company_id.ids + [False]),
+            ('type', 'in', ['normal', 'phantom'])  # Support both Manufacturing and Kit BOMs
+        ])
+        
+        variant_boms = {}
+        template_boms = {}
+        for bom in base_boms:
+            if bom.product_id:
+                variant_boms.setdefault(bom.product_id.id, []).append(bom)
+            else:
+                template_boms.setdefault(bom.product_tmpl_id.id, []).append(bom)
+        
+        result = {}
+        for line in self:
+            candidates = (
+                variant_boms.get(line.product_id.id, [])
+                + template_boms.get(line.product_id.product_tmpl_id.id, [])
+            )
+            result[line] = next(
+                (bom for bom in candidates if not bom.company_id or bom.company_id == line.company_id),
+                self.env['mrp.bom']
+            )
+        return result
+
+    def _raise_missing_base_bom(self):
+        """Raise a helpful error for a line whose product has no base BOM"""
+        if self.product_id.product_tmpl_id.product_variant_count > 1:
+            raise UserError(
+                "No base BOM found for product variant '%s'. "
+                "Please create a base BOM either for this specific variant "
+                "or for the product template '%s'." % 
+                (self.product_id.display_name, self.product_id.product_tmpl_id.name)
+            )
+        raise UserError(
+            "No base BOM found for product '%s'. Please create a base BOM first." % 
+            self.product_id.name
+        )
+
     @api.depends('product_id', 'product_id.is_flexible_bom', 'state')
     def _compute_show_flexible_bom_button(self):
         for line in self:
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_bom_find
+from . import test_performance
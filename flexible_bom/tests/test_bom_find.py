@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestBomFind(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        component = cls.env['product.product'].create({
+            'name': 'Component',
+            'type': 'consu',
+        })
+        templates = cls.env['product.template'].create([{
+            'name': f'Product {i}',
+            'type': 'consu',
+        } for i in range(300)])
+        cls.products = templates.product_variant_ids
+        # The first BOM of each product is marked as base on create
+        cls.boms = cls.env['mrp.bom'].create([{
+            'product_tmpl_id': template.id,
+            'product_qty': 1.0,
+            'type': 'normal',
+            'bom_line_ids': [(0, 0, {'product_id': component.id, 'product_qty': 1.0})],
+        } for template in templates])
+        # Variant-level base BOM of the first product
+        cls.variant_bom = cls.env['mrp.bom'].create({
+            'product_tmpl_id': templates[0].id,
+            'product_id': cls.products[0].id,
+            'product_qty': 1.0,
+            'type': 'normal',
+            'is_base_bom': True,
+            'bom_line_ids': [(0, 0, {'product_id': component.id, 'product_qty': 2.0})],
+        })
+
+    def _bom_find(self, products):
+        # Start from cold caches, like a new request
+        self.env.invalidate_all()
+        self.env['mrp.bom']._invalidate_base_bom_cache()
+        return self.env['mrp.bom']._bom_find(products, company_id=self.env.company.id)
+
+    def test_bom_find_base_boms(self):
+        self.assertTrue(all(self.boms.mapped('is_base_bom')))
+        result = self._bom_find(self.products)
+        self.assertEqual(set(result), set(self.products))
+        # The variant-level base BOM wins over the template-level one
+        self.assertEqual(result[self.products[0]], self.variant_bom)
+        for product, bom in zip(self.products[1:], self.boms[1:]):
+            self.assertEqual(result[product], bom)
+
+    def test_bom_find_query_count(self):
+        """Resolving the base BOMs of 300 products costs as many queries as for 10"""
+        self.env.flush_all()
+        start = self.env.cr.sql_log_count
+        self._bom_find(self.products[:10])
+        expected = self.env.cr.sql_log_count - start
+
+        self.env.invalidate_all()
+        self.env['mrp.bom']._invalidate_base_bom_cache()
+        with self.assertQueryCount(expected):
+            self.env['mrp.bom']._bom_find(self.products, company_id=self.env.company.id)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from odoo.tests import TransactionCase, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+# Benchmarks are not part of the standard test run:
+# odoo-bin -d <db> -i flexible_bom --test-tags flexible_bom_benchmark
+@tagged('post_install', '-at_install', '-standard', 'flexible_bom_benchmark')
+class TestFlexibleBomPerformance(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.components = cls.env['product.product'].create([{
+            'name': f'Component {i}',
+            'type': 'consu',
+            'standard_price': 1.0,
+        } for i in range(500)])
+        cls.product = cls.env['product.product'].create({
+            'name': 'Configurable Product',
+            'type': 'consu',
+        })
+        cls.base_bom = cls.env['mrp.bom'].create({
+            'product_tmpl_id': cls.product.product_tmpl_id.id,
+            'product_qty': 1.0,
+            'type': 'normal',
+            'bom_line_ids': [(0, 0, {
+                'product_id': cls.components[0].id,
+                'product_qty': 1.0,
+            })],
+        })
+        partner = cls.env['res.partner'].create({'name': 'Customer'})
+        cls.order = cls.env['sale.order'].create({
+            'partner_id': partner.id,
+            'order_line': [(0, 0, {
+                'product_id': cls.product.id,
+                'product_uom_qty': 1.0,
+            })],
+        })
+
+    def test_create_flexible_bom_500_lines(self):
+        """Wall time of the creation of a flexible BOM with 500 components"""
+        wizard = self.env['flexible.bom.wizard'].create({
+            'sale_order_line_id': self.order.order_line.id,
+            'base_bom_id': self.base_bom.id,
+            'product_id': self.product.id,
+            'bom_type': 'normal',
+            'bom_line_ids': [(0, 0, {
+                'product_id': component.id,
+                'product_qty': 2.0,
+                'product_uom_id': component.uom_id.id,
+                'sequence': i,
+            }) for i, component in enumerate(self.components)],
+        })
+        self.env.flush_all()
+
+        start = time.perf_counter()
+        start_queries = self.env.cr.sql_log_count
+        wizard.action_create_bom_and_delivery()
+        self.env.flush_all()
+        duration = time.perf_counter() - start
+        queries = self.env.cr.sql_log_count - start_queries
+
+        bom = wizard.created_bom_id
+        self.assertEqual(len(bom.bom_line_ids), 500)
+        self.assertEqual(self.order.order_line.flexible_bom_id, bom)
+        _logger.info(f"Flexible BOM with 500 lines created in {duration:.3f}s ({queries} queries)")
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
 
 from . import flexible_bom_wizard
+from . import flexible_bom_order_wizard
 from . import base_bom_setup_wizard
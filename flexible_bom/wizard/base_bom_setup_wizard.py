@@ -50,7 +50,8 @@ class BaseBomSetupWizard(models.TransientModel):
                         'bom_id': bom.id,
                         'is_current_base': bom.is_base_bom
                     }))
-                    if bom.is_base_bom:
+                    # A template-level base BOM is preferred over a variant one
+                    if bom.is_base_bom and (not current_base or not bom.product_id):
                         current_base = bom.id
                 
                 res['existing_bom_ids'] = bom_lines
@@ -69,12 +70,16 @@ class BaseBomSetupWizard(models.TransientModel):
         if not self.selected_base_bom_id:
             raise UserError(_("Please select a BOM to mark as base."))
         
-        # Unmark all current base BOMs for this product
+        # Unmark the current base BOM at the same level: the template-level
+        # one, or the one of the same variant; other variants keep theirs
         existing_bases = self.env['mrp.bom'].search([
             ('product_tmpl_id', '=', self.product_tmpl_id.id),
-            ('is_base_bom', '=', True)
+            ('product_id', '=', self.selected_base_bom_id.product_id.id),
+            ('is_base_bom', '=', True),
+            ('id', '!=', self.selected_base_bom_id.id)
         ])
         existing_bases.write({'is_base_bom': False})
+        existing_bases.flush_recordset(['is_base_bom'])
         
         # Mark selected BOM as base
         self.selected_base_bom_id.is_base_bom = True
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class FlexibleBomOrderWizard(models.TransientModel):
+    _name = 'flexible.bom.order.wizard'
+    _description = 'Flexible BOM Order Configuration Wizard'
+
+    order_id = fields.Many2one(
+        'sale.order',
+        string='Sales Order',
+        required=True
+    )
+    
+    line_ids = fields.One2many(
+        'flexible.bom.order.wizard.line',
+        'wizard_id',
+        string='Flexible Lines'
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        
+        order = self.env['sale.order'].browse(res.get('order_id'))
+        if not order or 'line_ids' not in fields_list:
+            return res
+        
+        # Lines that already have a flexible BOM are left out
+        sale_lines = order.order_line.filtered(
+            lambda line: line.product_id.is_flexible_bom and not line.flexible_bom_id
+        )
+        
+        # Base BOMs of every flexible line are loaded at once
+        base_boms = sale_lines._get_flexible_base_boms()
+        for sale_line in sale_lines:
+            if not base_boms[sale_line]:
+                sale_line._raise_missing_base_bom()
+        
+        res['line_ids'] = [(0, 0, {
+            'sale_order_line_id': sale_line.id,
+            'product_id': sale_line.product_id.id,
+            'base_bom_id': base_boms[sale_line].id,
+            'bom_type': base_boms[sale_line].type,
+            'bom_line_ids': [(0, 0, {
+                'product_id': line.product_id.id,
+                'product_qty': line.product_qty,
+                'product_uom_id': line.product_uom_id.id,
+                'sequence': line.sequence,
+            }) for line in base_boms[sale_line].bom_line_ids],
+        }) for sale_line in sale_lines]
+        return res
+
+    def action_create_boms(self):
+        """Create the flexible BOMs of all configured lines in one batch"""
+        self.ensure_one()
+        
+        if self.order_id.state != 'bom_customization':
+            raise UserError("Flexible BOMs of the whole order can only be configured in the BOM customization phase")
+        
+        lines = self.line_ids
+        if not lines:
+            raise UserError("There are no flexible lines to configure")
+        
+        # Never replace a flexible BOM set since the wizard was opened
+        configured = lines.filtered(lambda line: line.sale_order_line_id.flexible_bom_id)
+        if configured:
+            _logger.warning(f"⚠️ Skipping {len(configured)} lines of order {self.order_id.name} that already have a flexible BOM")
+            lines -= configured
+            if not lines:
+                raise UserError("All flexible lines already have a flexible BOM")
+        
+        _logger.info(f"Creating {len(lines)} flexible BOMs for order {self.order_id.name}")
+        
+        # Create every BOM with all its components in one go
+        new_boms = self.env['mrp.bom'].create([line._prepare_bom_vals() for line in lines])
+        
+        for line, new_bom in zip(lines, new_boms):
+            line.sale_order_line_id.write({
+                'flexible_bom_id': new_bom.id,
+                'price_unit': line.bom_line_ids._get_sale_price(line.product_id),
+            })
+        
+        message = f'✅ {len(new_boms)} BOMs Flexibles creadas exitosamente.'
+        if configured:
+            message += f' {len(configured)} líneas omitidas por tener ya una BOM flexible.'
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'BOMs Creadas',
+                'message': message,
+                'type': 'warning' if configured else 'success',
+                'next': {'type': 'ir.actions.act_window_close'},
+            }
+        }
+
+
+class FlexibleBomOrderWizardLine(models.TransientModel):
+    _name = 'flexible.bom.order.wizard.line'
+    _description = 'Flexible BOM Order Configuration Wizard Line'
+
+    wizard_id = fields.Many2one(
+        'flexible.bom.order.wizard',
+        string='Wizard',
+        required=True,
+        ondelete='cascade'
+    )
+    
+    sale_order_line_id = fields.Many2one(
+        'sale.order.line',
+        string='Sales Order Line',
+        required=True
+    )
+    
+    product_id = fields.Many2one(
+        'product.product',
+        string='Product',
+        required=True
+    )
+    
+    base_bom_id = fields.Many2one(
+        'mrp.bom',
+        string='Base BOM',
+        required=True
+    )
+    
+    bom_type = fields.Selection([
+        ('normal', 'Manufacture this product'),
+        ('phantom', 'Kit')
+    ], string='BOM Type', default='normal', required=True)
+    
+    bom_line_ids = fields.One2many(
+        'flexible.bom.line.wizard',
+        'order_wizard_line_id',
+        string='BOM Lines'
+    )
+    
+    component_count = fields.Integer(
+        string='Components',
+        compute='_compute_component_count'
+    )
+
+    @api.depends('bom_line_ids')
+    def _compute_component_count(self):
+        for line in self:
+            line.component_count = len(line.bom_line_ids)
+
+    def _prepare_bom_vals(self):
+        """Return the values of the flexible BOM of this line, components included"""
+        self.ensure_one()
+        order = self.sale_order_line_id.order_id
+        bom_code = f"{order.name}: {self.product_id.name}"
+        bom_code += f" ({'Kit' if self.bom_type == 'phantom' else 'Manufacturing'})"
+        
+        return {
+            'product_tmpl_id': self.product_id.product_tmpl_id.id,
+            'product_id': self.product_id.id,
+            'product_qty': 1.0,
+            'type': self.bom_type,
+            'is_flexible_bom': True,
+            'sale_order_line_id': self.sale_order_line_id.id,
+            'base_bom_id': self.base_bom_id.id,
+            'code': bom_code,
+            'bom_line_ids': self.bom_line_ids._prepare_bom_line_vals(),
+        }
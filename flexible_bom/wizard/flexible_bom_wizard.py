@@ -2,7 +2,9 @@
 
 from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.tools import float_compare, float_is_zero
 from datetime import timedelta
+from collections import defaultdict
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -74,6 +76,22 @@ class FlexibleBomWizard(models.TransientModel):
              'Si no está marcado, las entregas permanecerán como están (no recomendado para cambios importantes de BOM).'
     )
     
+    delivery_update_mode = fields.Selection([
+        ('incremental', 'Solo Cambios'),
+        ('rebuild', 'Recrear Todo')
+    ], string='Modo de Actualización', default='incremental', required=True,
+    help="- Solo Cambios: ajusta únicamente los movimientos de los componentes agregados, quitados o modificados, "
+         "conservando los demás movimientos y sus reservas. Solo aplica a BOMs Kit; en los demás casos "
+         "las entregas se recrean.\n"
+         "- Recrear Todo: cancela las entregas existentes de la línea y genera una nueva entrega completa.")
+    
+    run_in_background = fields.Boolean(
+        string='Actualizar Entregas en Segundo Plano',
+        default=False,
+        help='Si está marcado, las entregas se actualizan mediante una tarea programada y el resultado '
+             'se publica en el pedido. Recomendado para pedidos grandes.'
+    )
+    
     warning_message = fields.Text(
         string='Warning Message',
         help='Warning message for confirmed orders'
@@ -84,12 +102,38 @@ class FlexibleBomWizard(models.TransientModel):
         help='Warning message about delivery management'
     )
     
+    total_cost = fields.Float(
+        string='Costo Total',
+        compute='_compute_price_preview',
+        store=True,
+        digits='Product Price',
+        help='Costo de los componentes configurados, actualizado al editar las líneas'
+    )
+    
+    sale_price_preview = fields.Float(
+        string='Precio de Venta',
+        compute='_compute_price_preview',
+        store=True,
+        digits='Product Price',
+        help='Costo total más el margen de la categoría del producto'
+    )
+    
     base_bom_info = fields.Text(
         string='Base BOM Information',
         compute='_compute_base_bom_info',
         help='Information about which base BOM is being used'
     )
 
+    @api.depends('bom_line_ids.cost_subtotal', 'product_id.categ_id.flexible_bom_margin')
+    def _compute_price_preview(self):
+        """
+        Sum the stored line costs: editing a line only recomputes that
+        line's cost, never the prices of the other components.
+        """
+        for wizard in self:
+            wizard.total_cost = sum(wizard.bom_line_ids.mapped('cost_subtotal'))
+            wizard.sale_price_preview = wizard.bom_line_ids._get_sale_price(wizard.product_id)
+
     @api.depends('base_bom_id', 'product_id')
     def _compute_base_bom_info(self):
         """Compute information about the base BOM being used"""
@@ -240,19 +284,14 @@ class FlexibleBomWizard(models.TransientModel):
             'sale_order_line_id': self.sale_order_line_id.id,
             'base_bom_id': self.base_bom_id.id,
             'code': bom_code,
+            'bom_line_ids': self.bom_line_ids._prepare_bom_line_vals(),
         }
         
+        # Create the BOM and all its lines in one go
         new_bom = self.env['mrp.bom'].create(bom_vals)
         
-        # Create BOM lines
-        for bom_line in self.bom_line_ids:
-            self.env['mrp.bom.line'].create({
-                'bom_id': new_bom.id,
-                'product_id': bom_line.product_id.id,
-                'product_qty': bom_line.product_qty,
-                'product_uom_id': bom_line.product_uom_id.id,
-                'sequence': bom_line.sequence,
-            })
+        # BOM the current deliveries were generated from
+        previous_bom = self.sale_order_line_id.flexible_bom_id or self.base_bom_id
         
         # Update sale order line
         _logger.info(f"🔗 Assigning flexible BOM {new_bom.id} ({new_bom.display_name}) to sale order line {self.sale_order_line_id.id}")
@@ -264,58 +303,52 @@ class FlexibleBomWizard(models.TransientModel):
         
         # For confirmed orders, also create delivery
         if self.order_confirmed:
-            # Cancel existing deliveries first
-            if self.cancel_existing_deliveries:
-                try:
-                    delivery_message = self._cancel_existing_deliveries()
-                    _logger.info(f"Delivery cancellation completed with message: {delivery_message}")
-                except Exception as e:
-                    error_msg = f"Error durante cancelación de entregas: {str(e)}"
-                    _logger.error(error_msg)
-            
-            # Create new delivery
-            try:
-                result = self._create_delivery_with_flexible_bom()
-                if result.get('success'):
-                    success_msg = f'✅ BOM Flexible "{new_bom.code}" creada y nueva entrega generada exitosamente.'
-                    if result.get('picking_name'):
-                        success_msg += f'\n📦 Nueva entrega: {result["picking_name"]}'
-                    
-                    return {
-                        'type': 'ir.actions.client',
-                        'tag': 'display_notification',
-                        'params': {
-                            'title': 'BOM y Entrega Creados',
-                            'message': success_msg,
-                            'type': 'success',
-                            'sticky': True,
-                        }
-                    }
-                else:
-                    error_msg = f'BOM creada, pero error en entrega: {result.get("error", "Error desconocido")}'
-                    return {
-                        'type': 'ir.actions.client',
-                        'tag': 'display_notification',
-                        'params': {
-                            'title': 'BOM Creada - Error en Entrega',
-                            'message': error_msg,
-                            'type': 'warning',
-                            'sticky': True,
-                        }
-                    }
-            except Exception as e:
-                error_msg = f'BOM creada, pero error en entrega: {str(e)}'
-                _logger.error(error_msg)
+            # Big orders can be processed by the delivery job queue instead.
+            # A line with a pending job always goes through the queue: its
+            # deliveries are not generated from its current BOM yet, the job
+            # applies the change from the BOM they were generated from.
+            DeliveryJob = self.env['flexible.bom.delivery.job']
+            if self.run_in_background or DeliveryJob._get_pending_job(self.sale_order_line_id):
+                job = DeliveryJob._enqueue(
+                    self.sale_order_line_id,
+                    new_bom,
+                    previous_bom,
+                    cancel_existing_deliveries=self.cancel_existing_deliveries,
+                    delivery_update_mode=self.delivery_update_mode,
+                )
+                _logger.info(f"📥 Delivery update queued as job {job.id}")
                 return {
                     'type': 'ir.actions.client',
                     'tag': 'display_notification',
                     'params': {
-                        'title': 'BOM Creada - Error en Entrega',
-                        'message': error_msg,
-                        'type': 'warning',
+                        'title': 'BOM Creada - Entrega en Proceso',
+                        'message': f'✅ BOM Flexible "{new_bom.code}" creada. Las entregas se actualizarán en segundo plano '
+                                   f'y el resultado se publicará en el pedido {self.sale_order_line_id.order_id.name}.',
+                        'type': 'success',
                         'sticky': True,
                     }
                 }
+            
+            result = self._update_deliveries(previous_bom)
+            
+            success_msg = f'✅ BOM Flexible "{new_bom.code}" creada y nueva entrega generada exitosamente.'
+            if result.get('method') == 'incremental':
+                success_msg = f'✅ BOM Flexible "{new_bom.code}" creada y entregas actualizadas: {result["summary"]}'
+                if result.get('picking_name'):
+                    success_msg += f'\n📦 Entregas: {result["picking_name"]}'
+            elif result.get('picking_name'):
+                success_msg += f'\n📦 Nueva entrega: {result["picking_name"]}'
+            
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'BOM y Entrega Creados',
+                    'message': success_msg,
+                    'type': 'success',
+                    'sticky': True,
+                }
+            }
         else:
             # For draft orders, update price automatically
             self._update_sale_line_price()
@@ -329,73 +362,315 @@ class FlexibleBomWizard(models.TransientModel):
                 }
             }
 
+    def _update_deliveries(self, previous_bom):
+        """
+        Update the deliveries of the confirmed sale line to its new flexible
+        BOM, previous_bom being the BOM they were generated from.
+        Returns the result dict of the method that succeeded; raises a
+        UserError when no delivery could be generated, so nothing of the
+        update is kept.
+        """
+        # Apply only the component changes to the existing moves when possible
+        result = {}
+        if self.cancel_existing_deliveries and self.delivery_update_mode == 'incremental':
+            result = self._update_deliveries_incrementally(previous_bom)
+        
+        # Otherwise cancel existing deliveries first
+        if self.cancel_existing_deliveries and not result.get('success'):
+            delivery_message = self._cancel_existing_deliveries()
+            _logger.info(f"Delivery cancellation completed with message: {delivery_message}")
+        
+        # Create new delivery
+        if not result.get('success'):
+            result = self._create_delivery_with_flexible_bom()
+        if not result.get('success'):
+            # Nothing is kept: the BOM and the cancellations are rolled back
+            # with the rest of the transaction
+            raise UserError(
+                f'No se pudo generar la entrega con la BOM flexible: {result.get("error", "Error desconocido")}'
+            )
+        return result
+
     def action_create_bom(self):
         """Legacy method - redirect to new combined action"""
         return self.action_create_bom_and_delivery()
 
     def _update_sale_line_price(self):
         """Update sale order line price based on BOM components"""
-        total_cost = 0.0
-        
-        for bom_line in self.bom_line_ids:
-            component_cost = bom_line.product_id.standard_price * bom_line.product_qty
-            total_cost += component_cost
-        
-        # Add margin (you can make this configurable)
-        margin = 1.2  # 20% margin
-        new_price = total_cost * margin
-        
-        self.sale_order_line_id.price_unit = new_price
+        self.sale_order_line_id.price_unit = self.sale_price_preview
+
+    def _get_line_moves(self):
+        """
+        Return the open delivery moves of the edited sale line, reached
+        through their sale line and never by matching the origin name.
+        """
+        return self.env['stock.move'].search([
+            ('sale_line_id', '=', self.sale_order_line_id.id),
+            ('state', 'not in', ['done', 'cancel']),
+            ('picking_id', '!=', False),
+        ])
+
+    def _cancel_line_moves(self):
+        """
+        Cancel the open delivery moves of the edited sale line with one
+        _action_cancel, leaving the moves of the other lines of the same
+        deliveries untouched: a delivery is cancelled with its last open
+        move, so the deliveries shared with other lines stay open.
+        Returns the cancelled moves.
+        """
+        moves = self._get_line_moves()
+        if moves:
+            # Cancelling also releases their reservations
+            moves._action_cancel()
+        return moves
 
     def _cancel_existing_deliveries(self):
-        """Cancel existing deliveries for the sale order (separated from recreation)"""
+        """
+        Cancel existing deliveries for the sale order line (separated from recreation).
+        Only the moves of the line are cancelled, see _cancel_line_moves.
+        Errors are not swallowed, so a failed cancellation aborts the whole
+        update instead of leaving it half applied.
+        """
         _logger.info(f"=== CANCELLING EXISTING DELIVERIES ===")
         _logger.info(f"Sale order line: {self.sale_order_line_id.id}")
         
-        order = self.sale_order_line_id.order_id
-        _logger.info(f"Processing sale order: {order.name}")
-        
         delivery_info = []
         
-        try:
-            # Find all existing deliveries for this order
-            existing_pickings = self.env['stock.picking'].search([
-                ('origin', '=', order.name),
-                ('state', 'not in', ['done', 'cancel'])
-            ])
-            
-            _logger.info(f"Found {len(existing_pickings)} existing deliveries: {existing_pickings.mapped('name')}")
-            
-            if existing_pickings:
-                cancelled_names = []
-                for picking in existing_pickings:
-                    if picking.state == 'assigned':
-                        picking.do_unreserve()
-                    picking.action_cancel()
-                    cancelled_names.append(picking.name)
-                    _logger.info(f"Cancelled delivery: {picking.name}")
-                
-                delivery_info.append(f"✅ Entregas canceladas: {', '.join(cancelled_names)}")
-                delivery_info.append("ℹ️ Use el botón 'Crear Nuevo Delivery' para generar la entrega con la BOM personalizada")
-            else:
-                delivery_info.append("ℹ️ No se encontraron entregas para cancelar")
-            
-        except Exception as e:
-            error_msg = f"⚠️ Error en cancelación de entregas: {str(e)}"
-            delivery_info.append(error_msg)
-            _logger.error(f"Error in delivery cancellation: {str(e)}")
-            import traceback
-            _logger.error(traceback.format_exc())
+        # Cancel the existing moves of the edited line
+        cancelled_moves = self._cancel_line_moves()
+        
+        _logger.info(f"Cancelled {len(cancelled_moves)} moves")
+        
+        if cancelled_moves:
+            delivery_info.append(
+                f"✅ Movimientos de la línea cancelados en las entregas: {', '.join(cancelled_moves.picking_id.mapped('name'))}"
+            )
+            delivery_info.append("ℹ️ Use el botón 'Crear Nuevo Delivery' para generar la entrega con la BOM personalizada")
+        else:
+            delivery_info.append("ℹ️ No se encontraron entregas para cancelar")
         
         result = '\n'.join(delivery_info)
         _logger.info(f"Delivery cancellation completed. Result: {result}")
         return result
 
+    def _get_delivery_components(self, bom=None):
+        """
+        Return the components to deliver for the sale line as a list of
+        tuples (product, quantity, uom), for the given BOM or by default the
+        flexible BOM of the line.
+        KIT BOMs are flattened to their leaf components, read from the
+        stored KIT cache when the BOM has already been exploded.
+        Identical components are merged before any move is created.
+        """
+        line = self.sale_order_line_id
+        flexible_bom = bom or line.flexible_bom_id
+        if flexible_bom.type == 'phantom':
+            components = [
+                (product, qty, product.uom_id)
+                for product, qty in line._get_all_kit_components(
+                    line.product_id, flexible_bom, line.product_uom_qty
+                )
+            ]
+        else:
+            components = [
+                (bom_line.product_id, bom_line.product_qty * line.product_uom_qty, bom_line.product_uom_id)
+                for bom_line in flexible_bom.bom_line_ids
+            ]
+        location = line.order_id.warehouse_id.out_type_id.default_location_src_id
+        demands = line._group_kit_demands([
+            (line, product, qty, uom, location) for product, qty, uom in components
+        ])
+        return [
+            (product, qty, uom)
+            for (product, uom, location, sale_line), qty in demands.items()
+        ]
+
+    def _update_deliveries_incrementally(self, previous_bom):
+        """
+        Apply the component delta between previous_bom and the new flexible
+        BOM to the open moves of the sale line: quantities are adjusted,
+        removed components are cancelled and new components are added to an
+        existing delivery. Moves of unchanged components keep their
+        reservations. Returns a result dict like
+        _create_delivery_with_flexible_bom; success is False, before any
+        move is touched, when the update cannot be applied move by move so
+        the caller rebuilds:
+        - either BOM is not a KIT, the line then delivers the finished
+          product and not the components;
+        - the line has no open moves of its own;
+        - a changed or removed component has no move of its own on the line.
+        """
+        _logger.info(f"=== INCREMENTAL DELIVERY UPDATE ===")
+        
+        line = self.sale_order_line_id
+        if previous_bom.type != 'phantom' or line.flexible_bom_id.type != 'phantom':
+            return {
+                'success': False,
+                'error': 'Incremental update is only available for KIT BOMs'
+            }
+        
+        moves = self.env['stock.move'].search([
+            ('sale_line_id', '=', line.id),
+            ('state', 'not in', ['done', 'cancel']),
+            ('picking_id', '!=', False),
+        ])
+        if not moves:
+            return {
+                'success': False,
+                'error': 'No open moves found on sale order line'
+            }
+        
+        # Component quantities before and after, in the UoM of each product
+        def component_qty(components):
+            qty = defaultdict(float)
+            for product, product_qty, uom in components:
+                qty[product] += uom._compute_quantity(product_qty, product.uom_id)
+            return qty
+        
+        old_qty = component_qty(self._get_delivery_components(previous_bom))
+        new_qty = component_qty(self._get_delivery_components())
+        
+        moves_by_product = defaultdict(lambda: self.env['stock.move'])
+        for move in moves:
+            moves_by_product[move.product_id] |= move
+        
+        moves_to_cancel = self.env['stock.move']
+        move_ids_by_qty = defaultdict(list)
+        new_components = []
+        for product in set(old_qty) | set(new_qty):
+            delta = new_qty.get(product, 0.0) - old_qty.get(product, 0.0)
+            if float_is_zero(delta, precision_rounding=product.uom_id.rounding):
+                continue
+            product_moves = moves_by_product.get(product)
+            if old_qty.get(product) and not product_moves:
+                _logger.info(f"⚠️ Component {product.display_name} has no move of its own, rebuilding instead")
+                return {
+                    'success': False,
+                    'error': f'Component {product.display_name} has no open move on sale order line'
+                }
+            if not new_qty.get(product):
+                # Component removed from the BOM
+                moves_to_cancel |= product_moves
+            elif product_moves:
+                # Quantity changed, applied on one of the existing moves
+                move = product_moves[0]
+                move_qty = move.product_uom_qty + product.uom_id._compute_quantity(delta, move.product_uom)
+                if float_compare(move_qty, 0.0, precision_rounding=move.product_uom.rounding) <= 0:
+                    moves_to_cancel |= move
+                else:
+                    move_ids_by_qty[move_qty].append(move.id)
+            elif float_compare(delta, 0.0, precision_rounding=product.uom_id.rounding) > 0:
+                # Component added to the BOM
+                new_components.append((product, delta))
+        
+        changed_moves = self.env['stock.move']
+        for move_qty, move_ids in move_ids_by_qty.items():
+            qty_moves = self.env['stock.move'].browse(move_ids)
+            qty_moves.write({'product_uom_qty': move_qty})
+            changed_moves |= qty_moves
+        
+        if moves_to_cancel:
+            moves_to_cancel._action_cancel()
+        
+        new_moves = self.env['stock.move']
+        if new_components:
+            # Added components go to the delivery of the line's first open move
+            template = moves[0]
+            new_moves = self.env['stock.move'].create([{
+                'name': f"{line.name} - {product.name}",
+                'product_id': product.id,
+                'product_uom_qty': qty,
+                'product_uom': product.uom_id.id,
+                'picking_id': template.picking_id.id,
+                'location_id': template.location_id.id,
+                'location_dest_id': template.location_dest_id.id,
+                'sale_line_id': line.id,
+                'company_id': template.company_id.id,
+                'procure_method': 'make_to_stock',
+                'group_id': template.group_id.id,
+                'origin': template.origin,
+            } for product, qty in new_components])
+            new_moves._action_confirm()
+        
+        # Reserve only the moves that were added or changed
+        moves_to_assign = (changed_moves | new_moves).filtered(
+            lambda m: m.state in ('confirmed', 'partially_available')
+        )
+        if moves_to_assign:
+            moves_to_assign._action_assign()
+        
+        summary = (f"{len(new_moves)} agregados, {len(changed_moves)} modificados, "
+                   f"{len(moves_to_cancel)} cancelados")
+        _logger.info(f"✅ Incremental update SUCCESS: {summary}")
+        return {
+            'success': True,
+            'picking_name': ', '.join(moves.picking_id.mapped('name')),
+            'method': 'incremental',
+            'summary': summary,
+        }
+
+    def _create_manual_delivery(self):
+        """
+        Create and confirm a delivery for the components of the flexible BOM,
+        with all its moves in a single create call.
+        Returns the new picking, or an empty recordset when the BOM has no
+        components.
+        """
+        order = self.sale_order_line_id.order_id
+        line = self.sale_order_line_id
+        
+        components = self._get_delivery_components()
+        _logger.info(f"📋 Flexible BOM has {len(components)} components: {[c[0].name for c in components]}")
+        if not components:
+            return self.env['stock.picking']
+        
+        picking_type = order.warehouse_id.out_type_id
+        location_id = picking_type.default_location_src_id.id
+        location_dest_id = order.partner_shipping_id.property_stock_customer.id
+        
+        # Ensure procurement group exists and is linked
+        if not order.procurement_group_id:
+            order.procurement_group_id = self.env['procurement.group'].create(
+                line._prepare_procurement_group_vals()
+            )
+        
+        new_picking = self.env['stock.picking'].create({
+            'picking_type_id': picking_type.id,
+            'partner_id': order.partner_shipping_id.id,
+            'origin': order.name,
+            'location_id': location_id,
+            'location_dest_id': location_dest_id,
+            'company_id': order.company_id.id,
+            'state': 'draft',
+            'group_id': order.procurement_group_id.id,
+            'sale_id': order.id,
+            'move_ids': [(0, 0, {
+                'name': f"{line.name} - {component_product.name}",
+                'product_id': component_product.id,
+                'product_uom_qty': component_qty,
+                'product_uom': component_uom.id,
+                'location_id': location_id,
+                'location_dest_id': location_dest_id,
+                'sale_line_id': line.id,
+                'company_id': order.company_id.id,
+                'state': 'draft',
+                'procure_method': 'make_to_stock',
+                'group_id': order.procurement_group_id.id,
+                'origin': order.name,
+            }) for component_product, component_qty, component_uom in components],
+        })
+        new_picking.action_confirm()
+        return new_picking
+
     def _create_delivery_with_flexible_bom(self):
-        """Helper method to create delivery with flexible BOM - returns result dict"""
+        """
+        Helper method to create delivery with flexible BOM - returns result dict.
+        Each method runs in its own savepoint: a failed method leaves nothing
+        behind and the next one starts from a clean state, without committing
+        the request transaction.
+        """
         _logger.info(f"=== CREATING DELIVERY WITH FLEXIBLE BOM ===")
         
-        order = self.sale_order_line_id.order_id
         line = self.sale_order_line_id
         
         # Verify we have a flexible BOM
@@ -405,117 +680,63 @@ class FlexibleBomWizard(models.TransientModel):
                 'error': 'No flexible BOM found on sale order line'
             }
         
+        # Method 1: Try using stock rule with flexible BOM context
+        _logger.info("🔄 Method 1: Using _action_launch_stock_rule() with flexible BOM context")
+        
         try:
-            # Method 1: Try using stock rule with flexible BOM context
-            _logger.info("🔄 Method 1: Using _action_launch_stock_rule() with flexible BOM context")
-            
-            try:
+            with self.env.cr.savepoint():
                 line_with_context = line.with_context(
                     force_flexible_bom=True,
                     flexible_bom_id=line.flexible_bom_id.id,
                     use_flexible_bom=True
                 )
                 
+                previous_moves = self._get_line_moves()
                 line_with_context._action_launch_stock_rule()
-                self.env.cr.commit()
-                
-                # Check if delivery was created
-                new_pickings = self.env['stock.picking'].search([
-                    ('origin', '=', order.name),
-                    ('state', 'not in', ['done', 'cancel'])
-                ])
                 
-                if new_pickings:
-                    delivery_name = ', '.join(new_pickings.mapped('name'))
-                    _logger.info(f"✅ Method 1 SUCCESS: Created deliveries: {delivery_name}")
-                    return {
-                        'success': True,
-                        'picking_name': delivery_name,
-                        'method': 'stock_rule'
-                    }
-                    
-            except Exception as e1:
-                _logger.error(f"❌ Method 1 failed: {str(e1)}")
-            
-            # Method 2: Manual creation if Method 1 failed
-            _logger.info("🔄 Method 2: Manual delivery creation")
-            
-            flexible_bom = line.flexible_bom_id
-            bom_lines = flexible_bom.bom_line_ids
+                # Check if delivery was created; the new moves may also have
+                # been added to a delivery that was already open
+                new_pickings = (self._get_line_moves() - previous_moves).picking_id
             
-            if bom_lines:
-                # Create picking with proper sale order linkage
-                picking_type = order.warehouse_id.out_type_id
-                
-                # Ensure procurement group exists and is linked
-                if not order.procurement_group_id:
-                    group_vals = order._prepare_procurement_group()
-                    order.procurement_group_id = self.env['procurement.group'].create(group_vals)
-                
-                picking_vals = {
-                    'picking_type_id': picking_type.id,
-                    'partner_id': order.partner_shipping_id.id,
-                    'origin': order.name,
-                    'location_id': picking_type.default_location_src_id.id,
-                    'location_dest_id': order.partner_shipping_id.property_stock_customer.id,
-                    'company_id': order.company_id.id,
-                    'state': 'draft',
-                    'group_id': order.procurement_group_id.id,
+            if new_pickings:
+                delivery_name = ', '.join(new_pickings.mapped('name'))
+                _logger.info(f"✅ Method 1 SUCCESS: Created deliveries: {delivery_name}")
+                return {
+                    'success': True,
+                    'picking_name': delivery_name,
+                    'method': 'stock_rule'
                 }
                 
-                # Try to add sale_id if the field exists
-                try:
-                    if 'sale_id' in self.env['stock.picking']._fields:
-                        picking_vals['sale_id'] = order.id
-                except Exception:
-                    pass
-                
-                new_picking = self.env['stock.picking'].create(picking_vals)
-                
-                # Create moves for each component
-                moves_created = 0
-                for bom_line in bom_lines:
-                    component_qty = bom_line.product_qty * line.product_uom_qty
-                    
-                    move_vals = {
-                        'name': f"{line.name} - {bom_line.product_id.name}",
-                        'product_id': bom_line.product_id.id,
-                        'product_uom_qty': component_qty,
-                        'product_uom': bom_line.product_uom_id.id,
-                        'picking_id': new_picking.id,
-                        'location_id': picking_type.default_location_src_id.id,
-                        'location_dest_id': order.partner_shipping_id.property_stock_customer.id,
-                        'sale_line_id': line.id,
-                        'company_id': order.company_id.id,
-                        'state': 'draft',
-                        'procure_method': 'make_to_stock',
-                        'group_id': order.procurement_group_id.id,
-                        'origin': order.name,
-                    }
-                    
-                    self.env['stock.move'].create(move_vals)
-                    moves_created += 1
-                
-                if moves_created > 0:
-                    new_picking.action_confirm()
-                    _logger.info(f"✅ Method 2 SUCCESS: Created picking {new_picking.name} with {moves_created} moves")
-                    return {
-                        'success': True,
-                        'picking_name': new_picking.name,
-                        'method': 'manual'
-                    }
-            
+        except Exception as e1:
+            _logger.error(f"❌ Method 1 failed: {str(e1)}")
+            self.env.invalidate_all()
+        
+        # Method 2: Manual creation if Method 1 failed
+        _logger.info("🔄 Method 2: Manual delivery creation")
+        
+        try:
+            with self.env.cr.savepoint():
+                new_picking = self._create_manual_delivery()
+        except Exception as e2:
+            _logger.error(f"❌ Method 2 failed: {str(e2)}")
+            self.env.invalidate_all()
             return {
                 'success': False,
-                'error': 'No BOM lines found or could not create delivery'
+                'error': str(e2)
             }
-            
-        except Exception as e:
-            _logger.error(f"Error in _create_delivery_with_flexible_bom: {str(e)}")
+        
+        if new_picking:
+            _logger.info(f"✅ Method 2 SUCCESS: Created picking {new_picking.name} with {len(new_picking.move_ids)} moves")
             return {
-                'success': False,
-                'error': str(e)
+                'success': True,
+                'picking_name': new_picking.name,
+                'method': 'manual'
             }
+        
+        return {
+            'success': False,
+            'error': 'No BOM lines found or could not create delivery'
+        }
 
     def action_create_delivery(self):
         """Legacy method - creates delivery only (for backward compatibility)"""
@@ -545,174 +766,51 @@ class FlexibleBomWizard(models.TransientModel):
             }
 
     def _handle_delivery_update(self):
-        """Handle delivery cancellation and recreation when BOM is updated"""
+        """
+        Handle delivery cancellation and recreation when BOM is updated.
+        Cancellation and recreation form one atomic unit: when no delivery
+        can be recreated a UserError is raised, so the cancelled deliveries
+        are restored by the transaction rollback.
+        """
         _logger.info(f"=== DELIVERY UPDATE HANDLER ===")
         _logger.info(f"Sale order line: {self.sale_order_line_id.id}")
         
-        order = self.sale_order_line_id.order_id
-        _logger.info(f"Processing sale order: {order.name}")
+        line = self.sale_order_line_id
+        
+        # CRITICAL: Verify the flexible BOM is properly linked
+        if not line.flexible_bom_id:
+            _logger.error("❌ CRITICAL: Sale order line does not have flexible_bom_id set!")
+            return "⚠️ Error: La línea de venta no tiene BOM flexible asignada"
+        _logger.info(f"✅ Sale line linked to flexible BOM: {line.flexible_bom_id.id}")
         
         delivery_info = []
         
-        try:
-            # Step 1: Cancel all existing deliveries for this order
-            existing_pickings = self.env['stock.picking'].search([
-                ('origin', '=', order.name),
-                ('state', 'not in', ['done', 'cancel'])
-            ])
-            
-            _logger.info(f"Found {len(existing_pickings)} existing deliveries: {existing_pickings.mapped('name')}")
-            
-            if existing_pickings:
-                cancelled_names = []
-                for picking in existing_pickings:
-                    if picking.state == 'assigned':
-                        picking.do_unreserve()
-                    picking.action_cancel()
-                    cancelled_names.append(picking.name)
-                    _logger.info(f"Cancelled delivery: {picking.name}")
-                
-                delivery_info.append(f"✅ Entregas canceladas: {', '.join(cancelled_names)}")
-            
-            # Step 2: Force new delivery creation using multiple methods
-            _logger.info("=== RECREATING DELIVERIES ===")
-            
-            # Ensure procurement group exists
-            if not order.procurement_group_id:
-                group_vals = order._prepare_procurement_group()
-                order.procurement_group_id = self.env['procurement.group'].create(group_vals)
-            
-            # Get the sale order line
-            line = self.sale_order_line_id
-            
-            # CRITICAL: Verify the flexible BOM is properly linked
-            if not line.flexible_bom_id:
-                _logger.error("❌ CRITICAL: Sale order line does not have flexible_bom_id set!")
-                delivery_info.append("⚠️ Error: La línea de venta no tiene BOM flexible asignada")
-                return '\n'.join(delivery_info)
-            else:
-                _logger.info(f"✅ Sale line linked to flexible BOM: {line.flexible_bom_id.id}")
-            
-            # Method 1: Try using direct stock rule action with flexible BOM context
-            _logger.info("🔄 Method 1: Using _action_launch_stock_rule() with flexible BOM context")
-            
-            try:
-                # Set context to force flexible BOM usage
-                line_with_context = line.with_context(
-                    force_flexible_bom=True,
-                    flexible_bom_id=line.flexible_bom_id.id,
-                    use_flexible_bom=True
-                )
-                
-                # Call the stock rule directly
-                line_with_context._action_launch_stock_rule()
-                _logger.info("Stock rule launched with flexible BOM context")
-                
-                # Check if deliveries were created
-                self.env.cr.commit()  # Ensure changes are committed
-                
-                new_pickings_method1 = self.env['stock.picking'].search([
-                    ('origin', '=', order.name),
-                    ('state', 'not in', ['done', 'cancel'])
-                ])
-                
-                if new_pickings_method1:
-                    names = ', '.join(new_pickings_method1.mapped('name'))
-                    delivery_info.append(f"✅ Entregas creadas: {names}")
-                    _logger.info(f"✅ Method 1 SUCCESS: Created deliveries: {names}")
-                    
-                    # Log the components to verify flexible BOM usage
-                    for picking in new_pickings_method1:
-                        move_products = picking.move_ids.mapped('product_id.name')
-                        _logger.info(f"📦 Delivery {picking.name} components: {move_products}")
-                    
-                    return '\n'.join(delivery_info)  # Success, exit early
-                else:
-                    _logger.warning("⚠️ Method 1 failed - no deliveries created")
-                    
-            except Exception as e1:
-                _logger.error(f"❌ Method 1 error: {str(e1)}")
-            
-            # Method 2: Create delivery manually based on flexible BOM components
-            _logger.info("🔄 Method 2: Manual delivery creation from flexible BOM")
-            
-            try:
-                # Get BOM components directly from flexible BOM
-                flexible_bom = line.flexible_bom_id
-                bom_lines = flexible_bom.bom_line_ids
-                _logger.info(f"📋 Flexible BOM has {len(bom_lines)} components: {[bl.product_id.name for bl in bom_lines]}")
-                
-                if bom_lines:
-                    # Create a new picking manually
-                    picking_type = order.warehouse_id.out_type_id
-                    
-                    new_picking = self.env['stock.picking'].create({
-                        'picking_type_id': picking_type.id,
-                        'partner_id': order.partner_shipping_id.id,
-                        'origin': order.name,
-                        'location_id': picking_type.default_location_src_id.id,
-                        'location_dest_id': order.partner_shipping_id.property_stock_customer.id,
-                        'company_id': order.company_id.id,
-                        'state': 'draft',
-                    })
-                    _logger.info(f"📦 Created new picking: {new_picking.name}")
-                    
-                    # Create moves for each flexible BOM component
-                    moves_created = 0
-                    for bom_line in bom_lines:
-                        component_qty = bom_line.product_qty * line.product_uom_qty
-                        
-                        move_vals = {
-                            'name': f"{line.name} - {bom_line.product_id.name}",
-                            'product_id': bom_line.product_id.id,
-                            'product_uom_qty': component_qty,
-                            'product_uom': bom_line.product_uom_id.id,
-                            'picking_id': new_picking.id,
-                            'location_id': picking_type.default_location_src_id.id,
-                            'location_dest_id': order.partner_shipping_id.property_stock_customer.id,
-                            'sale_line_id': line.id,
-                            'company_id': order.company_id.id,
-                            'state': 'draft',
-                            'procure_method': 'make_to_stock',
-                        }
-                        
-                        move = self.env['stock.move'].create(move_vals)
-                        moves_created += 1
-                        _logger.info(f"✅ Created move for {bom_line.product_id.name} qty: {component_qty}")
-                    
-                    # Confirm the picking to make it ready
-                    if moves_created > 0:
-                        new_picking.action_confirm()
-                        delivery_info.append(f"✅ Entrega creada manualmente: {new_picking.name} ({moves_created} componentes)")
-                        _logger.info(f"✅ Method 2 SUCCESS: Created picking {new_picking.name} with {moves_created} moves")
-                        return '\n'.join(delivery_info)  # Success
-                    else:
-                        _logger.error("❌ No moves created for the picking")
-                        new_picking.unlink()  # Remove empty picking
-                else:
-                    _logger.error("❌ No components found in flexible BOM")
-                    
-            except Exception as e2:
-                _logger.error(f"❌ Method 2 error: {str(e2)}")
-                import traceback
-                _logger.error(traceback.format_exc())
-            
-            # If all methods failed
-            delivery_info.append("⚠️ No se pudo recrear la entrega automáticamente")
+        # Step 1: Cancel the existing moves of the edited line
+        cancelled_moves = self._cancel_line_moves()
+        
+        _logger.info(f"Cancelled {len(cancelled_moves)} moves")
+        
+        if cancelled_moves:
+            delivery_info.append(f"✅ Movimientos cancelados en las entregas: {', '.join(cancelled_moves.picking_id.mapped('name'))}")
+        
+        # Step 2: Recreate the deliveries, Method 1 then Method 2
+        _logger.info("=== RECREATING DELIVERIES ===")
+        result = self._create_delivery_with_flexible_bom()
+        
+        if not result.get('success'):
             _logger.error("❌ All delivery recreation methods failed")
-            
-        except Exception as e:
-            error_msg = f"⚠️ Error en actualización de entregas: {str(e)}"
-            delivery_info.append(error_msg)
-            _logger.error(f"Error in delivery update: {str(e)}")
-            import traceback
-            _logger.error(traceback.format_exc())
+            raise UserError(
+                f"No se pudo recrear la entrega automáticamente: {result.get('error', 'Error desconocido')}"
+            )
+        
+        if result.get('method') == 'manual':
+            delivery_info.append(f"✅ Entrega creada manualmente: {result['picking_name']}")
+        else:
+            delivery_info.append(f"✅ Entregas creadas: {result['picking_name']}")
         
         result = '\n'.join(delivery_info)
         _logger.info(f"Delivery update completed. Result: {result}")
         return result
-        _logger.info(f"Delivery update completed. Result: {result}")
-        return result
 
     def action_add_bom_line(self):
         """Add new BOM line"""
@@ -738,6 +836,12 @@ class FlexibleBomLineWizard(models.TransientModel):
         string='Wizard'
     )
     
+    order_wizard_line_id = fields.Many2one(
+        'flexible.bom.order.wizard.line',
+        string='Order Wizard Line',
+        ondelete='cascade'
+    )
+    
     sequence = fields.Integer(
         string='Sequence',
         default=10
@@ -760,12 +864,69 @@ class FlexibleBomLineWizard(models.TransientModel):
         string='Unit of Measure',
         required=True
     )
+    
+    unit_cost = fields.Float(
+        string='Unit Cost',
+        compute='_compute_unit_cost',
+        store=True,
+        digits='Product Price',
+        help='Rolled-up cost of one unit of the component, in its product UoM'
+    )
+    
+    cost_subtotal = fields.Float(
+        string='Cost',
+        compute='_compute_cost_subtotal',
+        store=True,
+        digits='Product Price'
+    )
 
     @api.onchange('product_id')
     def _onchange_product_id(self):
         if self.product_id:
             self.product_uom_id = self.product_id.uom_id
 
+    def _get_company(self):
+        sale_line = self.wizard_id.sale_order_line_id or self.order_wizard_line_id.sale_order_line_id
+        return sale_line.company_id or self.env.company
+
+    @api.depends('product_id')
+    def _compute_unit_cost(self):
+        """Only lines whose component changed are costed, all of them with one engine call per company"""
+        lines_by_company = defaultdict(lambda: self.browse())
+        for bom_line in self:
+            lines_by_company[bom_line._get_company()] |= bom_line
+        for company, bom_lines in lines_by_company.items():
+            costs = self.env['mrp.bom']._get_product_unit_costs(bom_lines.product_id, company)
+            for bom_line in bom_lines:
+                bom_line.unit_cost = costs.get(bom_line.product_id, 0.0)
+
+    @api.depends('unit_cost', 'product_qty', 'product_uom_id')
+    def _compute_cost_subtotal(self):
+        for bom_line in self:
+            if bom_line.product_id and bom_line.product_uom_id:
+                qty = bom_line.product_uom_id._compute_quantity(bom_line.product_qty, bom_line.product_id.uom_id)
+            else:
+                qty = bom_line.product_qty
+            bom_line.cost_subtotal = qty * bom_line.unit_cost
+
+    def _prepare_bom_line_vals(self):
+        """Return the ``bom_line_ids`` commands creating these components"""
+        return [(0, 0, {
+            'product_id': bom_line.product_id.id,
+            'product_qty': bom_line.product_qty,
+            'product_uom_id': bom_line.product_uom_id.id,
+            'sequence': bom_line.sequence,
+        }) for bom_line in self]
+
+    def _get_sale_price(self, product):
+        """
+        Sale price of one unit of product built from the configured
+        components: their stored cost plus the margin of the product
+        category.
+        """
+        total_cost = sum(self.mapped('cost_subtotal'))
+        return total_cost * (1 + product.categ_id.flexible_bom_margin / 100.0)
+
 
 class FlexibleBomRoutingWizard(models.TransientModel):
     _name = 'flexible.bom.routing.wizard'
@@ -1,6 +1,6 @@
 {
     'name': 'Sale Order Approval Workflow',
-    'version': '18.0.1.2.1',
+    'version': '18.0.1.4.0',
     'summary': '✅ Add Approval state to Sale Orders - Required step before confirmation',
     'description': """
 Sale Order Approval Workflow
@@ -36,10 +36,12 @@ Adds an "Approved" state to Sale Orders requiring approval before confirmation.
     'author': 'Your Company',
     'website': 'https://www.yourcompany.com',
     'category': 'Sales',
-    'depends': ['sale'],
+    'depends': ['sale_stock', 'mrp'],
     'data': [
+        'security/ir.model.access.csv',
         'views/sale_order_views.xml',
         'views/sale_order_bom_customization_menu.xml',
+        'views/sale_order_state_log_views.xml',
     ],
     'installable': True,
     'auto_install': False,
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
 from . import sale_order
+from . import sale_order_state_log
 from . import sale_order_line
 from . import mrp_bom
+from . import mrp_bom_line
+from . import mrp_bom_kit_cache
@@ -5,10 +5,35 @@ import logging
 
 _logger = logging.getLogger(__name__)
 
+# mrp.bom fields that change the leaves a KIT explodes to
+KIT_TREE_FIELDS = {
+    'product_tmpl_id', 'product_id', 'product_qty', 'product_uom_id',
+    'type', 'company_id', 'sequence', 'active', 'bom_line_ids',
+}
+
 
 class MrpBom(models.Model):
     _inherit = 'mrp.bom'
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        boms = super().create(vals_list)
+        self.env['mrp.bom.kit.cache']._invalidate_boms(boms)
+        return boms
+
+    def write(self, vals):
+        if KIT_TREE_FIELDS.intersection(vals):
+            # Before and after, in case the BOM moves to another product
+            self.env['mrp.bom.kit.cache']._invalidate_boms(self)
+            res = super().write(vals)
+            self.env['mrp.bom.kit.cache']._invalidate_boms(self)
+            return res
+        return super().write(vals)
+
+    def unlink(self):
+        self.env['mrp.bom.kit.cache']._invalidate_boms(self)
+        return super().unlink()
+
     @api.model
     def _bom_find(self, products=None, **kwargs):
         """
@@ -26,7 +51,6 @@ class MrpBom(models.Model):
                 product = products
         
         # First check if we're in a context where flexible BOM should be used
-        sale_line_id = self.env.context.get('sale_line_id')
         flexible_bom_id = self.env.context.get('flexible_bom_id')
         
         if flexible_bom_id:
@@ -35,15 +59,19 @@ class MrpBom(models.Model):
                 _logger.info(f"🎯 Using flexible BOM from context: {flexible_bom.display_name}")
                 return flexible_bom
         
-        if sale_line_id:
-            sale_line = self.env['sale.order.line'].browse(sale_line_id)
-            if sale_line.exists() and hasattr(sale_line, 'flexible_bom_id') and sale_line.flexible_bom_id:
-                # Check if the flexible BOM matches the product we're looking for
-                flexible_bom = sale_line.flexible_bom_id
-                if (product and flexible_bom.product_id == product) or \
-                   (product_tmpl and flexible_bom.product_tmpl_id == product_tmpl):
-                    _logger.info(f"🎯 Using flexible BOM from sale line: {flexible_bom.display_name}")
-                    return flexible_bom
+        # Flexible BOMs of the order being procured, {product_id: flexible_bom_id},
+        # see SaleOrderLine._get_flexible_bom_map
+        flexible_bom_map = self.env.context.get('flexible_bom_by_product')
+        if flexible_bom_map and products is not None and not product_tmpl:
+            result = super()._bom_find(products, **{k: v for k, v in kwargs.items() if k not in ['product_tmpl', 'product']})
+            bom_type = kwargs.get('bom_type')
+            for flexible_product in products:
+                bom_id = flexible_bom_map.get(flexible_product.id)
+                if bom_id:
+                    flexible_bom = self.browse(bom_id)
+                    if not bom_type or flexible_bom.type == bom_type:
+                        result[flexible_product] = flexible_bom
+            return result
         
         # If no flexible BOM context, use standard logic
         try:
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+import psycopg2
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class MrpBomKitCache(models.Model):
+    _name = 'mrp.bom.kit.cache'
+    _description = 'Flattened KIT BOM Components'
+
+    bom_id = fields.Many2one(
+        'mrp.bom',
+        string='KIT BOM',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade'
+    )
+
+    leaf_ids = fields.One2many(
+        'mrp.bom.kit.cache.leaf',
+        'cache_id',
+        string='Leaf Components'
+    )
+
+    # Every BOM and component product of the exploded tree, used to drop the
+    # entry as soon as any of them changes
+    tree_bom_ids = fields.Many2many(
+        'mrp.bom',
+        'mrp_bom_kit_cache_bom_rel',
+        'cache_id',
+        'bom_id',
+        string='BOMs in Tree'
+    )
+
+    tree_product_ids = fields.Many2many(
+        'product.product',
+        'mrp_bom_kit_cache_product_rel',
+        'cache_id',
+        'product_id',
+        string='Products in Tree'
+    )
+
+    _sql_constraints = [
+        ('bom_company_uniq',
+         'UNIQUE (bom_id, company_id)',
+         'A KIT BOM can only be flattened once per company!'),
+    ]
+
+    @api.model
+    def _get_leaves(self, boms, company_id):
+        """
+        Read the stored leaves of the given KIT BOMs.
+        Returns a dict {bom_id: {product_id: quantity per unit}} holding
+        only the BOMs that are already flattened.
+        """
+        caches = self.sudo().search([
+            ('bom_id', 'in', boms.ids),
+            ('company_id', '=', company_id),
+        ])
+        return {
+            cache.bom_id.id: {leaf.product_id.id: leaf.product_qty for leaf in cache.leaf_ids}
+            for cache in caches
+        }
+
+    @api.model
+    def _store_leaves(self, bom, company_id, leaves, bom_ids, product_ids):
+        """
+        Store the flattened leaves of a KIT BOM.
+        leaves: dict {product_id: quantity per unit, in the product UoM}
+        bom_ids, product_ids: every BOM and component product of the tree
+        """
+        products = self.env['product.product'].browse(list(leaves))
+        vals = {
+            'bom_id': bom.id,
+            'company_id': company_id,
+            'tree_bom_ids': [(6, 0, list(bom_ids))],
+            'tree_product_ids': [(6, 0, list(product_ids))],
+            'leaf_ids': [(0, 0, {
+                'product_id': product.id,
+                'product_qty': leaves[product.id],
+                'product_uom_id': product.uom_id.id,
+            }) for product in products],
+        }
+        # Another transaction may flatten the same KIT concurrently, in which
+        # case its entry is kept and ours is simply dropped
+        try:
+            with self.env.cr.savepoint(), tools.mute_logger('odoo.sql_db'):
+                self.sudo().create(vals)
+        except psycopg2.IntegrityError:
+            _logger.info(f"KIT BOM {bom.display_name} already flattened by another transaction")
+
+    @api.model
+    def _invalidate_boms(self, boms):
+        """
+        Drop the flattened leaves of every KIT whose tree contains one of the
+        given BOMs, or one of their products (a new or changed BOM for a
+        component may turn a leaf into a sub-KIT).
+        """
+        if not boms:
+            return
+        caches = self.sudo().search([
+            '|', '|',
+            ('tree_bom_ids', 'in', boms.ids),
+            ('tree_product_ids.product_tmpl_id', 'in', boms.product_tmpl_id.ids),
+            ('bom_id', 'in', boms.ids),
+        ])
+        if caches:
+            _logger.info(f"🧹 Invalidating {len(caches)} flattened KIT BOMs")
+            caches.unlink()
+
+
+class MrpBomKitCacheLeaf(models.Model):
+    _name = 'mrp.bom.kit.cache.leaf'
+    _description = 'Flattened KIT BOM Leaf Component'
+
+    cache_id = fields.Many2one(
+        'mrp.bom.kit.cache',
+        string='Flattened KIT',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Component',
+        required=True,
+        ondelete='cascade'
+    )
+
+    product_qty = fields.Float(
+        string='Quantity per Unit',
+        digits='Product Unit of Measure',
+        required=True
+    )
+
+    product_uom_id = fields.Many2one(
+        'uom.uom',
+        string='Unit of Measure',
+        required=True
+    )
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['mrp.bom.kit.cache']._invalidate_boms(lines.bom_id)
+        return lines
+
+    def write(self, vals):
+        boms = self.bom_id
+        res = super().write(vals)
+        self.env['mrp.bom.kit.cache']._invalidate_boms(boms | self.bom_id)
+        return res
+
+    def unlink(self):
+        self.env['mrp.bom.kit.cache']._invalidate_boms(self.bom_id)
+        return super().unlink()
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 import logging
 
@@ -19,103 +19,95 @@ class SaleOrder(models.Model):
     )
 
     def action_approve_order(self):
-        """Approve the sale order - transition to approved state"""
-        self.ensure_one()
-        _logger.info(f"Approving order {self.name} - transition to 'approved' state")
-        
-        if self.state in ['draft', 'sent']:
-            self.state = 'approved'
-            
-            # Add a message to the chatter
-            self.message_post(
-                body="✅ La orden ha sido aprobada. Lista para customización de BOM.",
-                message_type='notification'
+        """Approve the sale orders - transition to approved state"""
+        invalid_orders = self.filtered(lambda o: o.state not in ['draft', 'sent'])
+        if invalid_orders:
+            raise UserError(
+                f"Solo las cotizaciones en borrador o enviadas pueden ser aprobadas: "
+                f"{', '.join(invalid_orders.mapped('name'))}."
             )
-            
-            return True
-        else:
-            raise UserError("Solo las cotizaciones en borrador o enviadas pueden ser aprobadas.")
+        _logger.info(f"Approving {len(self)} orders - transition to 'approved' state")
+        
+        self.write({'state': 'approved'})
+        
+        return True
 
     def action_customize_bom(self):
-        """Move to BOM customization state"""
-        self.ensure_one()
-        _logger.info(f"Moving order {self.name} to BOM customization state")
-        
-        if self.state == 'approved':
-            self.state = 'bom_customization'
-            
-            # Add a message to the chatter
-            self.message_post(
-                body="🔧 Orden movida a la fase de customización de BOM. Configure BOMs antes de la confirmación.",
-                message_type='notification'
+        """Move the sale orders to BOM customization state"""
+        invalid_orders = self.filtered(lambda o: o.state != 'approved')
+        if invalid_orders:
+            raise UserError(
+                f"Solo las órdenes aprobadas pueden moverse a customización de BOM: "
+                f"{', '.join(invalid_orders.mapped('name'))}."
             )
-            
-            return True
-        else:
-            raise UserError("Solo las órdenes aprobadas pueden moverse a customización de BOM.")
+        _logger.info(f"Moving {len(self)} orders to BOM customization state")
+        
+        self.write({'state': 'bom_customization'})
+        
+        return True
 
     def action_confirm(self):
-        """Override confirm to require approval and BOM customization"""
+        """
+        Override confirm to require approval and BOM customization.
+        All the orders are confirmed with a single call to the standard
+        confirmation.
+        """
         # Check if this order has our custom states
         state_selection = dict(self._fields['state'].selection)
         has_approval_states = 'approved' in state_selection and 'bom_customization' in state_selection
         
-        if has_approval_states:
-            # Only apply our workflow rules if the order has our custom states
-            if self.state == 'bom_customization':
-                # Add a message before confirming
-                self.message_post(
-                    body="🚚 La orden está siendo confirmada. Creando entregas y órdenes de manufactura...",
-                    message_type='notification'
-                )
-                
-                # Temporarily change state to 'sent' so Odoo can confirm it
-                original_state = self.state
-                self.state = 'sent'
-                
-                try:
-                    # Call the original confirm method
-                    result = super().action_confirm()
-                    
-                    # Add success message
-                    self.message_post(
-                        body="✅ ¡Orden confirmada exitosamente!",
-                        message_type='notification'
-                    )
-                    
-                    return result
-                except Exception as e:
-                    # If confirmation fails, restore the original state
-                    self.state = original_state
-                    raise e
-                
-            elif self.state == 'approved':
-                raise UserError(
-                    "Esta orden está aprobada pero debe pasar por la fase de 'Customizar BOM' "
-                    "antes de ser confirmada. Por favor, haga clic en el botón 'Customize BOM' primero."
-                )
-            elif self.state in ['draft', 'sent']:
-                raise UserError(
-                    "Esta orden debe ser aprobada y pasar por customización de BOM antes de ser confirmada. "
-                    "Por favor, use el botón 'Approve Order' primero."
-                )
+        if not has_approval_states:
+            return super().action_confirm()
         
-        # For orders without approval workflow or in standard states, use standard behavior
-        return super().action_confirm()
-
-    def action_cancel(self):
-        """Override cancel to handle approved and BOM customization states"""
-        if self.state == 'approved':
-            self.message_post(
-                body="❌ Orden aprobada ha sido cancelada.",
-                message_type='notification'
+        # Only apply our workflow rules if the order has our custom states
+        approved_orders = self.filtered(lambda o: o.state == 'approved')
+        if approved_orders:
+            raise UserError(
+                f"Las órdenes {', '.join(approved_orders.mapped('name'))} están aprobadas pero deben pasar "
+                "por la fase de 'Customizar BOM' antes de ser confirmadas. "
+                "Por favor, haga clic en el botón 'Customize BOM' primero."
             )
-        elif self.state == 'bom_customization':
-            self.message_post(
-                body="❌ Orden en customización de BOM ha sido cancelada.",
-                message_type='notification'
+        quotations = self.filtered(lambda o: o.state in ['draft', 'sent'])
+        if quotations:
+            raise UserError(
+                f"Las órdenes {', '.join(quotations.mapped('name'))} deben ser aprobadas y pasar por "
+                "customización de BOM antes de ser confirmadas. "
+                "Por favor, use el botón 'Approve Order' primero."
             )
-        return super().action_cancel()
+        
+        customized_orders = self.filtered(lambda o: o.state == 'bom_customization')
+        if customized_orders:
+            _logger.info(f"Confirming {len(customized_orders)} orders after BOM customization")
+        
+        # Call the original confirm method, it accepts orders in BOM
+        # customization, see _confirmation_error_message
+        return super().action_confirm()
+
+    def _confirmation_error_message(self):
+        """
+        Allow orders in BOM customization to be confirmed directly, with the
+        same line checks as standard quotations.
+        """
+        self.ensure_one()
+        if self.state != 'bom_customization':
+            return super()._confirmation_error_message()
+        if any(
+            not line.display_type
+            and not line.is_downpayment
+            and not line.product_id
+            for line in self.order_line
+        ):
+            return _("A line on these orders missing a product, you cannot confirm it.")
+        return False
+
+    def write(self, vals):
+        """Record the state transitions in the state log, see sale.order.state.log"""
+        if 'state' not in vals:
+            return super().write(vals)
+        previous_states = {order: order.state for order in self}
+        result = super().write(vals)
+        self.env['sale.order.state.log']._log_transitions(previous_states)
+        return result
 
     @api.model
     def _get_state_label(self, state):
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
+from odoo.exceptions import UserError
+from collections import defaultdict
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -13,62 +15,91 @@ class SaleOrderLine(models.Model):
         """Override to inject flexible BOM into procurement"""
         values = super()._prepare_procurement_values(group_id)
         
-        # If this line has a flexible BOM, inject it into the procurement context
-        if hasattr(self, 'flexible_bom_id') and self.flexible_bom_id:
-            _logger.info(f"🔧 Injecting flexible BOM {self.flexible_bom_id.display_name} into procurement for line {self.id}")
-            values['flexible_bom_id'] = self.flexible_bom_id.id
-            # Override the standard BOM search
-            values['bom_id'] = self.flexible_bom_id.id
+        # If this line has a flexible BOM, inject it into the procurement context.
+        # The values are prepared for all the procured lines at once, see
+        # _get_flexible_bom_procurement_values; a line procured on its own
+        # prepares its own.
+        bom_values = self.env.context.get('flexible_bom_procurement_values')
+        if bom_values is None or self.id not in bom_values:
+            bom_values = self._get_flexible_bom_procurement_values()
+        values.update(bom_values.get(self.id, {}))
         
         return values
 
+    def _get_flexible_bom_procurement_values(self):
+        """
+        Return the procurement values of the lines with a flexible BOM as a
+        dict {line_id: values}, reading the BOMs and their types in one go.
+        """
+        if 'flexible_bom_id' not in self._fields:
+            return {}
+        self.fetch(['flexible_bom_id'])
+        self.flexible_bom_id.fetch(['type'])
+        # Every line gets an entry, empty without flexible BOM
+        bom_values = {line.id: {} for line in self}
+        flexible_lines = self.filtered('flexible_bom_id')
+        for line in flexible_lines:
+            bom_values[line.id] = {
+                'flexible_bom_id': line.flexible_bom_id.id,
+                # Override the standard BOM search
+                'bom_id': line.flexible_bom_id.id,
+            }
+        if flexible_lines:
+            _logger.info(f"🔧 Injecting flexible BOMs into procurement for {len(flexible_lines)} lines")
+        return bom_values
+
+    def _get_flexible_bom_map(self):
+        """
+        Return the flexible BOMs of the orders of these lines as a dict
+        {order_id: {product_id: flexible_bom_id}}, read with a single query.
+        When several lines of an order sell the same product, the first one wins.
+        """
+        if 'flexible_bom_id' not in self._fields or not self.order_id:
+            return {}
+        bom_map = defaultdict(dict)
+        lines = self.env['sale.order.line'].search_fetch([
+            ('order_id', 'in', self.order_id.ids),
+            ('flexible_bom_id', '!=', False),
+        ], ['order_id', 'product_id', 'flexible_bom_id'], order='id')
+        for line in lines:
+            bom_map[line.order_id.id].setdefault(line.product_id.id, line.flexible_bom_id.id)
+        return bom_map
+
     def _find_flexible_bom_for_product(self, product):
         """
         Find flexible BOM for a product in the current sale order.
         If no flexible BOM exists, fallback to base BOM.
+        The order's map is taken from the procurement context when available,
+        see _action_launch_stock_rule.
         """
-        # First, check if there's a flexible BOM for this product in the same sale order
-        # Look for flexible BOMs that are linked to sale order lines in this order
-        sale_lines_with_flexible_bom = self.env['sale.order.line'].search([
-            ('order_id', '=', self.order_id.id),
-            ('product_id', '=', product.id),
-            ('flexible_bom_id', '!=', False)
-        ])
+        bom_map = self.env.context.get('flexible_bom_by_product')
+        if bom_map is None:
+            bom_map = self._get_flexible_bom_map().get(self.order_id.id, {})
         
-        if sale_lines_with_flexible_bom:
-            flexible_bom = sale_lines_with_flexible_bom[0].flexible_bom_id
+        flexible_bom_id = bom_map.get(product.id)
+        if flexible_bom_id:
+            flexible_bom = self.env['mrp.bom'].browse(flexible_bom_id)
             _logger.info(f"Found flexible BOM {flexible_bom.display_name} for product {product.display_name} in sale order")
             return flexible_bom
         
-        # Alternative search: look for flexible BOMs created for this product recently
-        flexible_bom = self.env['mrp.bom'].search([
-            ('product_id', '=', product.id),
-            ('is_flexible_bom', '=', True)
-        ], order='create_date desc', limit=1)
-        
-        if flexible_bom:
-            _logger.info(f"Found recent flexible BOM {flexible_bom.display_name} for product {product.display_name}")
-            return flexible_bom
-        
         # If no flexible BOM, use base BOM
-        base_bom = self.env['mrp.bom']._bom_find(
+        base_bom = self.env['mrp.bom'].with_context(flexible_bom_by_product=False)._bom_find(
             product,
             company_id=self.company_id.id,
             bom_type='phantom'  # Only look for KIT BOMs
-        )
+        ).get(product)
         
         if base_bom:
             _logger.info(f"Using base BOM {base_bom.display_name} for product {product.display_name}")
         
-        return base_bom
+        return base_bom or self.env['mrp.bom']
 
-    def _get_all_kit_components(self, product, bom, qty=1.0):
+    def _get_all_kit_components(self, product, bom, qty=1.0, memo=None):
         """
-        Recursively expand BOM to get all leaf components for KIT type BOMs.
-        Returns a list of tuples (component_product, total_quantity)
+        Expand BOM to get all leaf components for KIT type BOMs.
+        Returns a list of tuples (component_product, total_quantity), one per product.
+        memo: dict shared by the calls of one procurement run, see _explode_kit_bom
         """
-        components = []
-        
         if not bom:
             _logger.info(f"⚠️ No BOM provided for product {product.display_name}, treating as leaf component")
             return [(product, qty)]
@@ -78,145 +109,271 @@ class SaleOrderLine(models.Model):
             _logger.info(f"📋 BOM {bom.display_name} is not KIT type (type: {bom.type}), treating {product.display_name} as leaf")
             return [(product, qty)]
         
-        _logger.info(f"🔧 Expanding KIT BOM {bom.display_name} for product {product.display_name} (qty: {qty})")
-        
-        for line in bom.bom_line_ids:
-            component_product = line.product_id
-            component_qty = line.product_qty * qty
-            
-            _logger.info(f"  📦 Component: {component_product.display_name} (qty: {component_qty})")
-            
-            # For sub-components, always use base BOM (since they weren't customized)
-            component_bom = self.env['mrp.bom']._bom_find(
-                component_product,
-                company_id=self.company_id.id,
-                bom_type='phantom'  # Only look for KIT BOMs
+        leaves = self._explode_kit_bom(bom, memo if memo is not None else {})
+        components = [
+            (component_product, leaves[component_product.id] * qty)
+            for component_product in self.env['product.product'].browse(list(leaves))
+        ]
+        _logger.info(f"🎯 KIT {bom.display_name} for {product.display_name} (qty: {qty}) expands to {len(components)} leaf components")
+        return components
+
+    def _explode_kit_bom(self, bom, memo):
+        """
+        Explode a KIT BOM into its leaf components.
+        Returns a dict {product_id: quantity} for one unit of the BOM product,
+        quantities being expressed in the UoM of each component product.
+
+        Sub-KIT BOMs are resolved level by level with one _bom_find call per
+        level, and the leaves of every BOM are memoised in ``memo`` so that
+        shared sub-KITs are expanded only once per procurement run.
+        The leaves of the exploded BOM are also stored in mrp.bom.kit.cache,
+        so later runs read them back instead of walking the tree again.
+        """
+        company_id = self.company_id.id or self.env.company.id
+        kit_boms = memo.setdefault('kit_boms', {})
+        leaves = memo.setdefault('leaves', {})
+        trees = memo.setdefault('trees', {})
+        
+        key = (company_id, bom.id)
+        if key in leaves:
+            return leaves[key]
+        KitCache = self.env['mrp.bom.kit.cache']
+        stored = KitCache._get_leaves(bom, company_id)
+        if bom.id in stored:
+            leaves[key] = stored[bom.id]
+            return leaves[key]
+        
+        # For sub-components, always use base BOM (since they weren't customized)
+        Bom = self.env['mrp.bom'].with_context(flexible_bom_id=False, flexible_bom_by_product=False)
+        
+        # Resolve the KIT BOMs of the whole tree, one level at a time
+        level = bom
+        seen = self.env['mrp.bom']
+        while level:
+            seen |= level
+            products = level.bom_line_ids.product_id.filtered(
+                lambda p: (company_id, p.id) not in kit_boms
             )
-            
-            if component_bom and component_bom.type == 'phantom':
-                _logger.info(f"    🔧 Component {component_product.display_name} has KIT BOM {component_bom.display_name}, expanding...")
-                # Recursively expand this component's BOM
-                sub_components = self._get_all_kit_components(
-                    component_product, 
-                    component_bom, 
-                    component_qty
+            if products:
+                found = Bom._bom_find(products, company_id=company_id, bom_type='phantom')
+                for component_product in products:
+                    component_bom = found.get(component_product) or self.env['mrp.bom']
+                    kit_boms[(company_id, component_product.id)] = (
+                        component_bom if component_bom.type == 'phantom' else self.env['mrp.bom']
+                    )
+            level = self.env['mrp.bom'].union(*(
+                kit_boms[(company_id, line.product_id.id)] for line in level.bom_line_ids
+            )).filtered(lambda b: b not in seen and (company_id, b.id) not in trees)
+        
+        def explode(kit_bom, path):
+            key = (company_id, kit_bom.id)
+            if key in trees:
+                return leaves[key]
+            if kit_bom.id in path:
+                raise UserError(
+                    f"Error de recursión: el KIT {kit_bom.display_name} se contiene a sí mismo "
+                    f"en sus sub-KITs."
                 )
-                components.extend(sub_components)
+            path.add(kit_bom.id)
+            result = defaultdict(float)
+            tree_bom_ids = {kit_bom.id}
+            tree_product_ids = set(kit_bom.bom_line_ids.product_id.ids)
+            for line in kit_bom.bom_line_ids:
+                component_product = line.product_id
+                line_qty = line.product_uom_id._compute_quantity(
+                    line.product_qty, component_product.uom_id
+                ) / (kit_bom.product_qty or 1.0)
+                sub_bom = kit_boms[(company_id, component_product.id)]
+                if sub_bom:
+                    for leaf_id, leaf_qty in explode(sub_bom, path).items():
+                        result[leaf_id] += line_qty * leaf_qty
+                    sub_bom_ids, sub_product_ids = trees[(company_id, sub_bom.id)]
+                    tree_bom_ids |= sub_bom_ids
+                    tree_product_ids |= sub_product_ids
+                else:
+                    result[component_product.id] += line_qty
+            path.discard(kit_bom.id)
+            leaves[key] = dict(result)
+            trees[key] = (tree_bom_ids, tree_product_ids)
+            return leaves[key]
+        
+        result = explode(bom, set())
+        KitCache._store_leaves(bom, company_id, result, *trees[key])
+        return result
+
+    def _get_kit_delivery_boms(self):
+        """
+        Return the BOM used to deliver each line as a dict {line: bom}.
+        The flexible BOM of a line has priority; the BOMs of the other lines
+        are found with one _bom_find call per company.
+        """
+        boms = {}
+        lines_by_company = defaultdict(lambda: self.env['sale.order.line'])
+        for line in self:
+            if 'flexible_bom_id' in line._fields and line.flexible_bom_id:
+                _logger.info(f"✅ Using assigned flexible BOM: {line.flexible_bom_id.display_name} (ID: {line.flexible_bom_id.id})")
+                boms[line] = line.flexible_bom_id
             else:
-                # This is a leaf component
-                _logger.info(f"    ✅ {component_product.display_name} is leaf component (qty: {component_qty})")
-                components.append((component_product, component_qty))
+                lines_by_company[line.company_id] |= line
         
-        _logger.info(f"🎯 Final components for {product.display_name}: {[(c[0].display_name, c[1]) for c in components]}")
-        return components
+        # Fallback: Get the base BOM of the products
+        Bom = self.env['mrp.bom'].with_context(flexible_bom_id=False, flexible_bom_by_product=False)
+        for company, lines in lines_by_company.items():
+            found = Bom._bom_find(lines.product_id, company_id=company.id)
+            for line in lines:
+                boms[line] = found.get(line.product_id) or self.env['mrp.bom']
+        return boms
 
-    def _action_launch_stock_rule(self):
+    def _action_launch_stock_rule(self, **kwargs):
         """
         Override to handle KIT BOM expansion for deliveries.
         When a product has a KIT BOM with sub-KIT components, 
         create delivery for all leaf components instead.
         Uses flexible BOM if available, otherwise uses base BOM.
+
+        All the KIT lines of the recordset are delivered together, see
+        _create_kit_stock_moves; the other lines use the standard behavior.
         """
-        _logger.info(f"Launching stock rule for sale line {self.id} - Product: {self.product_id.display_name}")
-        
-        # First priority: Check if this sale line has a flexible BOM assigned
-        bom = None
-        if hasattr(self, 'flexible_bom_id') and self.flexible_bom_id:
-            bom = self.flexible_bom_id
-            _logger.info(f"✅ Using assigned flexible BOM: {bom.display_name} (ID: {bom.id})")
-        else:
-            # Fallback: Get the base BOM for this product
-            bom = self.env['mrp.bom']._bom_find(
-                self.product_id,
-                company_id=self.company_id.id
-            )
-            if bom:
-                _logger.info(f"⚠️ No flexible BOM found, using base BOM: {bom.display_name}")
-            else:
-                _logger.info(f"❌ No BOM found for product {self.product_id.display_name}")
-        
-        if bom and bom.type == 'phantom':  # KIT BOM
-            _logger.info(f"🔧 Processing KIT BOM {bom.display_name} for product {self.product_id.display_name}")
-            
-            # Get all leaf components from the BOM (flexible or base)
-            all_components = self._get_all_kit_components(
-                self.product_id, 
-                bom, 
-                self.product_uom_qty
-            )
-            
-            if all_components:
-                _logger.info(f"📦 Expanded KIT to {len(all_components)} leaf components: {[c[0].display_name for c in all_components]}")
-                
-                # Create stock moves for each leaf component instead of the main product
-                self._create_kit_stock_moves(all_components)
-                return
-            else:
-                _logger.info("⚠️ No components found in KIT BOM")
-        elif bom:
-            _logger.info(f"📋 BOM {bom.display_name} is not a KIT (type: {bom.type}), using standard behavior")
+        _logger.info(f"Launching stock rule for {len(self)} sale lines")
+        
+        boms = self._get_kit_delivery_boms()
+        memo = {}
+        components_by_line = {}
+        for line in self:
+            bom = boms[line]
+            if bom and bom.type == 'phantom':  # KIT BOM
+                # Get all leaf components from the BOM (flexible or base)
+                all_components = line._get_all_kit_components(
+                    line.product_id,
+                    bom,
+                    line.product_uom_qty,
+                    memo=memo
+                )
+                if all_components:
+                    components_by_line[line] = all_components
+                else:
+                    _logger.info(f"⚠️ No components found in KIT BOM {bom.display_name}")
+            elif bom:
+                _logger.info(f"📋 BOM {bom.display_name} is not a KIT (type: {bom.type}), using standard behavior")
+        
+        kit_lines = self.env['sale.order.line'].union(*components_by_line)
+        if kit_lines:
+            # Create stock moves for the leaf components instead of the main products
+            kit_lines._create_kit_stock_moves(components_by_line)
         
         # If not a KIT or no BOM, use standard behavior
-        _logger.info("🔄 Using standard stock rule behavior")
-        return super()._action_launch_stock_rule()
+        # Procure them order by order, with the order's flexible BOMs in
+        # context so that _bom_find resolves them without any query
+        other_lines = self - kit_lines
+        if other_lines:
+            _logger.info(f"🔄 Using standard stock rule behavior for {len(other_lines)} lines")
+            bom_map = other_lines._get_flexible_bom_map()
+            bom_values = other_lines._get_flexible_bom_procurement_values()
+            for order in other_lines.order_id:
+                order_lines = other_lines.filtered(lambda l: l.order_id == order)
+                super(SaleOrderLine, order_lines.with_context(
+                    flexible_bom_by_product=bom_map.get(order.id, {}),
+                    flexible_bom_procurement_values=bom_values,
+                ))._action_launch_stock_rule(**kwargs)
+        return True
+
+    @api.model
+    def _group_kit_demands(self, demands):
+        """
+        Aggregate identical KIT component demands before any move is created.
+        demands: iterable of tuples (sale line, product, quantity, uom, location)
+        Returns a dict {(product, uom, location, sale line): quantity}.
+        Like the standard move merge, demands are never merged across sale
+        lines, so every move keeps the sale line it is delivered for.
+        """
+        grouped = defaultdict(float)
+        for line, product, qty, uom, location in demands:
+            grouped[(product, uom, location, line)] += qty
+        return dict(grouped)
 
-    def _create_kit_stock_moves(self, components):
+    def _create_kit_stock_moves(self, components_by_line):
         """
-        Create stock moves for KIT components.
-        components: list of tuples (product, quantity)
+        Create the deliveries of KIT components.
+        components_by_line: dict {sale line: list of tuples (product, quantity)}
+
+        Components are aggregated by product, UoM, location and sale line
+        (see _group_kit_demands), and each order gets one picking per
+        warehouse holding the moves of all its KIT lines.
+        All pickings are created with their moves in one create call and
+        confirmed together.
         """
-        _logger.info(f"Creating stock moves for {len(components)} KIT components")
+        _logger.info(f"Creating stock moves for the KIT components of {len(self)} sale lines")
         
-        # Get the warehouse and location info
-        warehouse = self.order_id._get_warehouse()
-        if not warehouse:
-            _logger.error("No warehouse found for sale order")
-            return
+        # Prefetch the names and UoMs of all components in one read
+        products = self.env['product.product'].union(*(
+            product for components in components_by_line.values() for product, qty in components
+        ))
+        products.fetch(['display_name', 'uom_id'])
         
-        # Group components by product to avoid duplicates
-        component_dict = {}
-        for product, qty in components:
-            if product.id in component_dict:
-                component_dict[product.id]['qty'] += qty
-            else:
-                component_dict[product.id] = {
-                    'product': product,
-                    'qty': qty
-                }
-        
-        # Create a delivery order for the components
-        picking_vals = {
-            'partner_id': self.order_id.partner_shipping_id.id,
-            'picking_type_id': warehouse.out_type_id.id,
-            'location_id': warehouse.out_type_id.default_location_src_id.id,
-            'location_dest_id': self.order_id.partner_shipping_id.property_stock_customer.id,
-            'origin': self.order_id.name,
-            'move_type': 'direct',
+        # Collect the component demands per (order, warehouse)
+        demands_by_picking = defaultdict(list)
+        for line, components in components_by_line.items():
+            order = line.order_id
+            warehouse = line.warehouse_id or order.warehouse_id
+            if not warehouse:
+                _logger.error(f"No warehouse found for sale order {order.name}")
+                continue
+            location = warehouse.out_type_id.default_location_src_id
+            demands_by_picking[(order, warehouse)] += [
+                (line, product, qty, product.uom_id, location) for product, qty in components
+            ]
+        
+        # Merge identical demands before any move is created
+        moves_by_picking = {
+            picking_key: self._group_kit_demands(demands)
+            for picking_key, demands in demands_by_picking.items()
         }
         
-        picking = self.env['stock.picking'].create(picking_vals)
-        _logger.info(f"Created picking {picking.name} for KIT components")
-        
-        # Create stock moves for each component
-        for component_data in component_dict.values():
-            product = component_data['product']
-            qty = component_data['qty']
-            
-            move_vals = {
-                'name': f"{self.order_id.name} - {product.display_name}",
-                'product_id': product.id,
-                'product_uom_qty': qty,
-                'product_uom': product.uom_id.id,
-                'picking_id': picking.id,
+        if not moves_by_picking:
+            return
+        
+        # Ensure every order has a procurement group, created in one batch
+        orders = self.env['sale.order'].union(*(order for order, warehouse in moves_by_picking))
+        orders_without_group = orders.filtered(lambda o: not o.procurement_group_id)
+        if orders_without_group:
+            groups = self.env['procurement.group'].create([
+                order.order_line[:1]._prepare_procurement_group_vals()
+                for order in orders_without_group
+            ])
+            for order, group in zip(orders_without_group, groups):
+                order.procurement_group_id = group
+        
+        picking_vals_list = []
+        for (order, warehouse), moves in moves_by_picking.items():
+            location_dest_id = order.partner_shipping_id.property_stock_customer.id
+            picking_vals_list.append({
+                'partner_id': order.partner_shipping_id.id,
+                'picking_type_id': warehouse.out_type_id.id,
                 'location_id': warehouse.out_type_id.default_location_src_id.id,
-                'location_dest_id': self.order_id.partner_shipping_id.property_stock_customer.id,
-                'sale_line_id': self.id,
-                'origin': self.order_id.name,
-            }
-            
-            move = self.env['stock.move'].create(move_vals)
-            _logger.info(f"Created stock move for {product.display_name} - Qty: {qty}")
+                'location_dest_id': location_dest_id,
+                'origin': order.name,
+                'move_type': 'direct',
+                'company_id': order.company_id.id,
+                'group_id': order.procurement_group_id.id,
+                'sale_id': order.id,
+                'move_ids': [(0, 0, {
+                    'name': f"{order.name} - {product.display_name}",
+                    'product_id': product.id,
+                    'product_uom_qty': qty,
+                    'product_uom': uom.id,
+                    'location_id': location.id,
+                    'location_dest_id': location_dest_id,
+                    'sale_line_id': sale_line.id,
+                    'group_id': order.procurement_group_id.id,
+                    'company_id': order.company_id.id,
+                    'origin': order.name,
+                }) for (product, uom, location, sale_line), qty in moves.items()],
+            })
+        
+        # Create a delivery order per order and warehouse, with their moves
+        pickings = self.env['stock.picking'].create(picking_vals_list)
+        _logger.info(f"Created pickings {pickings.mapped('name')} for KIT components")
         
-        # Confirm the picking to make it available
-        picking.action_confirm()
-        _logger.info(f"Confirmed picking {picking.name}")
+        # Confirm the pickings to make them available
+        pickings.action_confirm()
+        _logger.info(f"Confirmed pickings {pickings.mapped('name')}")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class SaleOrderStateLog(models.Model):
+    _name = 'sale.order.state.log'
+    _description = 'Sale Order State Transition'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    order_id = fields.Many2one(
+        'sale.order',
+        string='Sales Order',
+        required=True,
+        index=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        readonly=True
+    )
+
+    from_state = fields.Selection(
+        selection=lambda self: self.env['sale.order']._fields['state'].selection,
+        string='From State',
+        readonly=True
+    )
+
+    to_state = fields.Selection(
+        selection=lambda self: self.env['sale.order']._fields['state'].selection,
+        string='To State',
+        required=True,
+        index=True,
+        readonly=True
+    )
+
+    user_id = fields.Many2one(
+        'res.users',
+        string='User',
+        readonly=True
+    )
+
+    date = fields.Datetime(
+        string='Date',
+        required=True,
+        readonly=True
+    )
+
+    duration = fields.Float(
+        string='Hours in Previous State',
+        aggregator='avg',
+        readonly=True,
+        help='Time spent by the order in the state it left, in hours'
+    )
+
+    @api.model
+    def _log_transitions(self, previous_states):
+        """
+        Record the state change of the given orders.
+        previous_states: dict {order: state before the change}
+        The time spent in the previous state is measured from the order's
+        last transition, or from its creation, and all the rows are
+        created at once.
+        """
+        if not previous_states:
+            return
+        orders = self.env['sale.order'].union(*previous_states)
+        last_dates = dict(self.sudo()._read_group(
+            [('order_id', 'in', orders.ids)],
+            ['order_id'],
+            ['date:max']
+        ))
+        now = fields.Datetime.now()
+        vals_list = []
+        for order, from_state in previous_states.items():
+            if order.state == from_state:
+                continue
+            entered = last_dates.get(order) or order.create_date or now
+            vals_list.append({
+                'order_id': order.id,
+                'company_id': order.company_id.id,
+                'from_state': from_state,
+                'to_state': order.state,
+                'user_id': self.env.uid,
+                'date': now,
+                'duration': (now - entered).total_seconds() / 3600.0,
+            })
+        if vals_list:
+            self.sudo().create(vals_list)
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_kit_stock_moves
+from . import test_performance
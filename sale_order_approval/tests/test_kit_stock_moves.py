@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo.sql_db import Cursor
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import SQL
+
+
+@tagged('post_install', '-at_install')
+class TestKitStockMoves(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.components = cls.env['product.product'].create([{
+            'name': f'Component {i}',
+            'type': 'consu',
+        } for i in range(200)])
+        cls.kit = cls.env['product.product'].create({
+            'name': 'Kit',
+            'type': 'consu',
+        })
+        cls.partner = cls.env['res.partner'].create({'name': 'Customer'})
+
+    def _create_order_line(self):
+        order = self.env['sale.order'].create({
+            'partner_id': self.partner.id,
+            'order_line': [(0, 0, {
+                'product_id': self.kit.id,
+                'product_uom_qty': 1.0,
+            })],
+        })
+        return order.order_line
+
+    def _count_inserts(self, line, components):
+        """Number of INSERT statements run to deliver ``components`` for ``line``"""
+        inserts = []
+        execute = Cursor.execute
+
+        def counting_execute(cr, query, params=None, log_exceptions=True):
+            code = query.code if isinstance(query, SQL) else query
+            if code.lstrip().upper().startswith('INSERT'):
+                inserts.append(code)
+            return execute(cr, query, params, log_exceptions)
+
+        self.env.flush_all()
+        with patch.object(Cursor, 'execute', counting_execute):
+            line._create_kit_stock_moves({line: [(component, 1.0) for component in components]})
+            self.env.flush_all()
+        return len(inserts)
+
+    def test_kit_moves_insert_count(self):
+        """Delivering 200 components runs as many INSERT statements as 5 components"""
+        # Warm up the records created on first use
+        self._count_inserts(self._create_order_line(), self.components[:5])
+
+        small_line = self._create_order_line()
+        large_line = self._create_order_line()
+        small_inserts = self._count_inserts(small_line, self.components[:5])
+        large_inserts = self._count_inserts(large_line, self.components)
+
+        self.assertEqual(len(large_line.order_id.picking_ids.move_ids), 200)
+        self.assertEqual(large_inserts, small_inserts)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from odoo.tests import TransactionCase, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+# Benchmarks are not part of the standard test run:
+# odoo-bin -d <db> -i sale_order_approval --test-tags sale_order_approval_benchmark
+@tagged('post_install', '-at_install', '-standard', 'sale_order_approval_benchmark')
+class TestKitExplosionPerformance(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Product = cls.env['product.product']
+        Bom = cls.env['mrp.bom']
+
+        # 6 levels: the top KIT, 4 levels of 4 shared sub-KITs each using all
+        # the sub-KITs of the next level, and 2,000 leaves split over the 4
+        # KITs of the last level
+        cls.leaves = Product.create([{'name': f'Leaf {i}', 'type': 'consu'} for i in range(2000)])
+        level_kits = Product.create([{'name': f'Kit 5.{i}', 'type': 'consu'} for i in range(4)])
+        Bom.create([{
+            'product_tmpl_id': kit.product_tmpl_id.id,
+            'product_qty': 1.0,
+            'type': 'phantom',
+            'bom_line_ids': [(0, 0, {
+                'product_id': leaf.id,
+                'product_qty': 1.0,
+            }) for leaf in cls.leaves[i * 500:(i + 1) * 500]],
+        } for i, kit in enumerate(level_kits)])
+        for level in (4, 3, 2):
+            sub_kits = level_kits
+            level_kits = Product.create([{'name': f'Kit {level}.{i}', 'type': 'consu'} for i in range(4)])
+            Bom.create([{
+                'product_tmpl_id': kit.product_tmpl_id.id,
+                'product_qty': 1.0,
+                'type': 'phantom',
+                'bom_line_ids': [(0, 0, {
+                    'product_id': sub_kit.id,
+                    'product_qty': 1.0,
+                }) for sub_kit in sub_kits],
+            } for kit in level_kits])
+        cls.product = Product.create({'name': 'Kit 1', 'type': 'consu'})
+        cls.bom = Bom.create({
+            'product_tmpl_id': cls.product.product_tmpl_id.id,
+            'product_qty': 1.0,
+            'type': 'phantom',
+            'bom_line_ids': [(0, 0, {
+                'product_id': sub_kit.id,
+                'product_qty': 1.0,
+            }) for sub_kit in level_kits],
+        })
+
+    def _explode(self):
+        self.env.invalidate_all()
+        start = time.perf_counter()
+        start_queries = self.env.cr.sql_log_count
+        components = self.env['sale.order.line']._get_all_kit_components(self.product, self.bom, 1.0, memo={})
+        return dict(components), time.perf_counter() - start, self.env.cr.sql_log_count - start_queries
+
+    def test_explode_6_levels_2000_leaves(self):
+        """Wall time of the explosion of a 6-level KIT with 2,000 leaves"""
+        self.env.flush_all()
+        components, duration, queries = self._explode()
+        _logger.info(f"6-level KIT with 2,000 leaves exploded in {duration:.3f}s ({queries} queries)")
+
+        # Each leaf is reached through 4 * 4 * 4 paths of shared sub-KITs
+        self.assertEqual(set(components), set(self.leaves))
+        self.assertTrue(all(qty == 64.0 for qty in components.values()))
+
+        # Later runs read the flattened leaves back from the KIT cache
+        self.env.flush_all()
+        cached_components, duration, queries = self._explode()
+        _logger.info(f"Same KIT read from the KIT cache in {duration:.3f}s ({queries} queries)")
+        self.assertEqual(cached_components, components)